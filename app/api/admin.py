@@ -9,6 +9,11 @@ from sqlalchemy import text
 from app.database.database import get_db
 from app.database.models import Base, InboundHistory, Inventory, StockLog
 from app.database.database import engine
+from app.services.inventory_cache import inventory_snapshot
+from app.services.reference_cache import reference_cache
+from app.core.process_pool import cpu_pool
+from app.services.analytics_cache import analytics_flights, analytics_results
+from app.services.daily_snapshot_service import backfill_daily_snapshots
 
 router = APIRouter(prefix="/api/admin", tags=["Admin"])
 
@@ -41,6 +46,18 @@ def db_check(db: Session = Depends(get_db)):
         return {"error": str(e)}
 
 
+@router.get("/cache-stats")
+def cache_stats():
+    """프로세스 내 캐시 적중률 등 상태 확인"""
+    return {
+        "inventory_snapshot": inventory_snapshot.stats(),
+        "reference_data": reference_cache.stats(),
+        "analytics_results": analytics_results.stats(),
+        "analytics_inflight": analytics_flights.stats(),
+        "cpu_pool": cpu_pool.stats(),
+    }
+
+
 @router.post("/create-missing-tables")
 def create_missing_tables():
     """누락된 테이블(inbound_history 등) 생성"""
@@ -51,12 +68,23 @@ def create_missing_tables():
         return {"error": str(e)}
 
 
+@router.post("/backfill-daily-snapshot")
+def backfill_daily_snapshot(db: Session = Depends(get_db)):
+    """StockLog 이력 + 현재 재고로 일자별 마감 재고 스냅샷(inventory_daily_snapshot) 재생성"""
+    try:
+        rows = backfill_daily_snapshots(db)
+        return {"message": f"일자별 재고 스냅샷 재생성 완료 ({rows}행)"}
+    except Exception as e:
+        db.rollback()
+        return {"error": str(e)}
+
+
 @router.post("/reset-data")
 def reset_data(db: Session = Depends(get_db)):
     """
     사용자(users) 제외 모든 데이터 초기화
     보존: users, blood_master, master_config, safety_config, system_settings
-    초기화: inventory, stock_log, inbound_history, inventory_ratio_history,
+    초기화: inventory, stock_log, inbound_history, inventory_ratio_history, inventory_daily_snapshot,
              blood_stocks, qc_results, result_type_mapping, test_items, test_lots
     """
     try:
@@ -69,8 +97,11 @@ def reset_data(db: Session = Depends(get_db)):
             "test_lots",
             "blood_stocks",
             "inbound_history",
+            "inbound_upload_digest",
             "stock_log",
             "inventory_ratio_history",
+            "inventory_daily_snapshot",
+            "inventory_rollup",
         ]
         for tbl in tables_to_delete:
             try:
@@ -79,11 +110,12 @@ def reset_data(db: Session = Depends(get_db)):
             except Exception as e:
                 results[tbl] = f"건너뜀 ({str(e)[:60]})"
 
-        # inventory 수량 0으로 초기화
-        r = db.execute(text("UPDATE inventory SET current_qty = 0"))
+        # inventory 수량 0으로 초기화 (version 증가 → 초기화 전 조회한 화면의 저장은 conflict)
+        r = db.execute(text("UPDATE inventory SET current_qty = 0, version = version + 1"))
         results["inventory"] = f"수량 0 초기화 {r.rowcount}행"
 
         db.commit()
+        inventory_snapshot.invalidate()
         return {"message": "✅ 데이터 초기화 완료 (users 보존)", "details": results}
     except Exception as e:
         db.rollback()
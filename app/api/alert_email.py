@@ -1,13 +1,15 @@
 """
 Alert Email Management API & Danger Alert Log API
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
 
 from app.database.database import get_db
+from app.core.etag import make_etag, is_not_modified, set_etag, not_modified
 from app.database.models import AlertEmail, DangerAlertLog, User
 
 router = APIRouter()
@@ -50,8 +52,13 @@ class DangerAlertResponse(BaseModel):
 # ── Alert Email Endpoints ─────────────────────────────────────────────────────
 
 @router.get("/api/alert-emails/", response_model=List[AlertEmailResponse])
-def list_alert_emails(db: Session = Depends(get_db)):
-    """알람 수신 이메일 목록 조회"""
+def list_alert_emails(request: Request, response: Response, db: Session = Depends(get_db)):
+    """알람 수신 이메일 목록 조회 - (행 수, 최대 ID)를 ETag로 반환, 일치 시 304"""
+    count, max_id = db.query(func.count(AlertEmail.id), func.max(AlertEmail.id)).one()
+    etag = make_etag("alert-emails", count, max_id)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
     return db.query(AlertEmail).order_by(AlertEmail.created_at.asc()).all()
 
 
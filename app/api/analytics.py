@@ -1,7 +1,14 @@
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.database.database import get_db
-from app.services.analytics_service import get_analytics_data
+from app.database.database import SessionLocal, get_db
+from app.core.process_pool import CpuPoolBusyError, CpuTaskTimeoutError
+from app.services.analytics_service import GRANULARITIES, get_cached_analytics_data
+from app.services.daily_snapshot_service import get_daily_levels, daily_levels_to_dict
+from app.services.export_service import EXPORT_DATASETS, EXPORT_FORMATS, iter_export_bytes
+from app.services.reference_cache import BLOOD_TYPES
+from app.services.reference_cache import reference_cache
 from datetime import datetime, timedelta
 
 router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
@@ -10,15 +17,93 @@ router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
 def get_dashboard_data(
     start_date: str = Query(None, description="시작일 (YYYY-MM-DD)"),
     end_date: str = Query(None, description="종료일 (YYYY-MM-DD)"),
+    granularity: str = Query("auto", description="집계 단위 (auto/event/hour/day/week/month)"),
+    max_points: int = Query(None, ge=3, le=20000, description="재고 추이 차트 최대 점 개수 (LTTB 다운샘플링)"),
     db: Session = Depends(get_db)
 ):
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity는 {', '.join(GRANULARITIES)} 중 하나입니다.")
     if not end_date:
         end_date = datetime.now().strftime("%Y-%m-%d")
     if not start_date:
         start_date = (datetime.strptime(end_date, "%Y-%m-%d") - timedelta(days=30)).strftime("%Y-%m-%d")
         
     try:
-        data = get_analytics_data(db, start_date, end_date)
+        data = get_cached_analytics_data(db, start_date, end_date, granularity, max_points)
         return data
+    except CpuPoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except CpuTaskTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/daily-levels")
+def get_daily_level_data(
+    start_date: str = Query(None, description="시작일 (YYYY-MM-DD)"),
+    end_date: str = Query(None, description="종료일 (YYYY-MM-DD)"),
+    db: Session = Depends(get_db)
+):
+    """일자별 마감 재고 (inventory_daily_snapshot 범위 조회)"""
+    if not end_date:
+        end_date = datetime.now().strftime("%Y-%m-%d")
+    if not start_date:
+        start_date = (datetime.strptime(end_date, "%Y-%m-%d") - timedelta(days=30)).strftime("%Y-%m-%d")
+
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="날짜 형식은 YYYY-MM-DD 입니다.")
+    if start > end:
+        raise HTTPException(status_code=400, detail="시작일이 종료일보다 늦습니다.")
+
+    try:
+        prep_map = {p.id: p.preparation for p in reference_cache.get(db).preps.values()}
+        return daily_levels_to_dict(get_daily_levels(db, start, end), prep_map)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/export/{dataset}")
+def export_dataset(
+    dataset: str,
+    format: str = Query("parquet", description="parquet | arrow (Arrow IPC stream)"),
+    start_date: Optional[str] = Query(None, description="시작일 (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="종료일 (YYYY-MM-DD)"),
+    blood_type: Optional[List[str]] = Query(None, description="혈액형 (반복 지정 가능)"),
+):
+    """
+    재고 이력 컬럼형 내보내기 (stock_log / inbound_history / daily_levels)
+
+    행을 서버 측 커서 배치로 읽어 인코딩하는 즉시 스트리밍 (메모리 일정).
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(status_code=404, detail=f"데이터셋은 {', '.join(EXPORT_DATASETS)} 중 하나입니다.")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format은 {', '.join(EXPORT_FORMATS)} 중 하나입니다.")
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="날짜 형식은 YYYY-MM-DD 입니다.")
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="시작일이 종료일보다 늦습니다.")
+    if blood_type and not set(blood_type) <= set(BLOOD_TYPES):
+        raise HTTPException(status_code=400, detail=f"혈액형은 {', '.join(BLOOD_TYPES)} 중에서 지정합니다.")
+
+    def stream():
+        # 응답 전송이 끝날 때까지 커서를 유지해야 하므로 요청 의존성(get_db) 대신 전용 세션 사용
+        db = SessionLocal()
+        try:
+            yield from iter_export_bytes(db, dataset, format, start=start, end=end, blood_types=blood_type)
+        finally:
+            db.close()
+
+    extension, media_type = EXPORT_FORMATS[format]
+    filename = f"{dataset}_{start_date or 'all'}_{end_date or 'now'}.{extension}"
+    return StreamingResponse(
+        stream(), media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
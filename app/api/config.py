@@ -1,14 +1,18 @@
 """
 Configuration API endpoints - RBC 재고비 관리 (혈액형/제제별 + 공통 일괄 적용)
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
 from app.database.database import get_db
+from app.core.etag import make_etag, is_not_modified, set_etag, not_modified
 from app.database.models import MasterConfig, InventoryRatioHistory, BloodMaster
+from app.services.inventory_cache import inventory_snapshot
+from app.services.reference_cache import reference_cache
 
 router = APIRouter()
 
@@ -98,6 +102,8 @@ def update_rbc_ratio_config(update: RBCRatioUpdate, db: Session = Depends(get_db
         config.config_value = str(update.ratio_percent)
     db.commit()
     db.refresh(config)
+    reference_cache.invalidate()
+    inventory_snapshot.invalidate()
     return RBCRatioResponse(
         ratio_percent=int(config.config_value),
         description=config.description or "PRBC vs Prefiltered RBC ratio"
@@ -105,11 +111,20 @@ def update_rbc_ratio_config(update: RBCRatioUpdate, db: Session = Depends(get_db
 
 
 @router.get("/rbc-factors", response_model=List[RBCFactorsResponse])
-def get_rbc_factors(db: Session = Depends(get_db)):
+def get_rbc_factors(request: Request, response: Response, db: Session = Depends(get_db)):
     """
     RBC 재고비 설정 목록 조회
     - 공통 설정 + 혈액형/제제별 설정 모두 반환
+    - (행 수, 최종 수정일시)를 ETag로 반환, If-None-Match 일치 시 304
     """
+    count, last_updated = db.query(
+        func.count(MasterConfig.id), func.max(MasterConfig.updated_at)
+    ).filter(MasterConfig.config_key == 'rbc_factors').one()
+    etag = make_etag("rbc-factors", count, last_updated)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
     configs = db.query(MasterConfig).filter(
         MasterConfig.config_key == 'rbc_factors'
     ).all()
@@ -223,6 +238,8 @@ def update_rbc_factors(update: RBCFactorsUpdate, db: Session = Depends(get_db)):
     ).update({"safety_qty": prefiltered_target})
 
     db.commit()
+    reference_cache.invalidate()
+    inventory_snapshot.invalidate()
 
     return {
         "success": True,
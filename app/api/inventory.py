@@ -1,11 +1,16 @@
 """
 Inventory API endpoints
 """
+import asyncio
+import os
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status, File, UploadFile, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.database.database import get_db
-from sqlalchemy import desc
+from app.core.etag import PROCESS_TOKEN, make_etag, is_not_modified, set_etag, not_modified
+from sqlalchemy import desc, insert
 from app.database.models import BloodMaster, Inventory, StockLog, InboundHistory, User
 from app.schemas.schemas import (
     InventoryStatusResponse,
@@ -16,23 +21,31 @@ from app.schemas.schemas import (
     BulkSaveResponse,
     BulkSaveResult,
 )
-from app.services.inventory_service import (
-    get_inventory_status,
-    update_inventory_and_log
+from app.services.inventory_service import update_inventory_and_log, conditional_update_inventory
+from app.services.daily_snapshot_service import record_daily_levels
+from app.services.rollup_service import refresh_all_rollups
+from app.services.inventory_cache import inventory_snapshot
+from app.services.reference_cache import reference_cache
+from app.services.inventory_events import inventory_events, format_sse
+from app.services.alert_service import check_blood_type_rbc_alert, check_single_item_alert, evaluate_rbc_danger
+from app.services.excel_service import spool_upload
+from app.services.inbound_upload_service import (
+    InboundUploadError, find_duplicate_uploads, parse_uploaded_files, save_inbound_uploads
 )
-from app.services.alert_service import check_blood_type_rbc_alert, check_single_item_alert
-from app.services.excel_service import parse_excel_inventory
+from app.services.upload_jobs import create_upload_job, start_upload_job
 
 router = APIRouter(prefix="/api/inventory", tags=["Inventory"])
 
 
 @router.get("/status", response_model=InventoryStatusResponse)
-def get_status(db: Session = Depends(get_db)):
+def get_status(request: Request, response: Response, db: Session = Depends(get_db)):
     """
     현재 재고 현황 조회
     
     - RBC 제제는 동적 목표재고 계산 포함
     - 알람 상태 체크 (현재재고 < 알람기준)
+    - 프로세스 내 스냅샷 캐시에서 응답 (cold/stale 시에만 DB 조회)
+    - 스냅샷 버전을 ETag로 반환, If-None-Match 일치 시 304
     
     Args:
         db: Database session
@@ -41,7 +54,13 @@ def get_status(db: Session = Depends(get_db)):
         재고 현황 및 통계
     """
     try:
-        items, alert_count, rbc_ratio = get_inventory_status(db)
+        version, items, alert_count, rbc_ratio = inventory_snapshot.get_status(db)
+
+        if version is not None:
+            etag = make_etag("inventory-status", PROCESS_TOKEN, version)
+            if is_not_modified(request, etag):
+                return not_modified(etag)
+            set_etag(response, etag)
         
         # Convert to InventoryItem models
         inventory_items = [InventoryItem(**item) for item in items]
@@ -59,8 +78,44 @@ def get_status(db: Session = Depends(get_db)):
         )
 
 
+STREAM_KEEPALIVE_SECONDS = 15
+
+
+@router.get("/stream")
+async def stream_inventory_events(request: Request):
+    """
+    재고 변경 실시간 스트림 (Server-Sent Events)
+
+    - event: cell   → {blood_type, prep_id, qty, version, row_version} (커밋된 셀 변경)
+    - event: danger → bulk-save 위험재고 알람과 동일한 항목
+    - 15초마다 keepalive 주석 전송 (프록시 유휴 타임아웃 방지)
+    """
+    queue = inventory_events.subscribe()
+
+    async def event_generator():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                if await request.is_disconnected():
+                    break
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            inventory_events.unsubscribe(queue)
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/update", response_model=InventoryUpdateResponse)
-def update_inventory(request: InventoryUpdateRequest, db: Session = Depends(get_db)):
+def update_inventory(request: InventoryUpdateRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """
     재고 업데이트 및 로그 기록
     
@@ -80,7 +135,7 @@ def update_inventory(request: InventoryUpdateRequest, db: Session = Depends(get_
     """
     try:
         # Get preparation name
-        blood_master = db.query(BloodMaster).filter(BloodMaster.id == request.prep_id).first()
+        blood_master = reference_cache.get(db).prep(request.prep_id)
         if not blood_master:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -96,6 +151,8 @@ def update_inventory(request: InventoryUpdateRequest, db: Session = Depends(get_
             out_qty=request.out_qty,
             remark=request.remark
         )
+        # 분석 롤업은 응답 후 갱신 (분석 조회는 읽기 전용)
+        background_tasks.add_task(refresh_all_rollups)
         
         # Check for alerts after update
         alert_data = None
@@ -119,7 +176,7 @@ def update_inventory(request: InventoryUpdateRequest, db: Session = Depends(get_
             previous_qty=previous_qty,
             current_qty=inventory.current_qty,
             log_id=stock_log.id,
-            alert=alert_email  # Alert email data for GAS
+            alert=alert_data
         )
         
     except ValueError as e:
@@ -135,8 +192,6 @@ def update_inventory(request: InventoryUpdateRequest, db: Session = Depends(get_
         )
 
 
-from fastapi import BackgroundTasks
-
 @router.post("/bulk-save", response_model=BulkSaveResponse)
 def bulk_save_inventory(request: BulkSaveRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """
@@ -145,61 +200,107 @@ def bulk_save_inventory(request: BulkSaveRequest, background_tasks: BackgroundTa
     - qty는 절대값(입력한 새 재고량). 서버에서 delta 자동 계산.
     - delta > 0 → in_qty,  delta < 0 → out_qty 로 StockLog 기록
     - updated_at은 서버 시간 기준으로 자동 기록
+    - 제제 정보는 기준정보 캐시, Inventory는 IN 쿼리로 한 번에 조회, 변경분은 일괄 기록
+      (셀 수와 무관하게 DB 왕복 횟수 일정)
+    - 낙관적 동시성: 셀별 version(조회 시점 값)이 현재와 다르면 해당 셀은 conflict로 거부.
+      version 미전달 셀도 조회~갱신 사이 다른 저장이 끼어들면 거부되어 StockLog delta가 항상 정확함
     """
     results: list[BulkSaveResult] = []
     success_count = 0
     fail_count = 0
 
+    prep_ids = {item.prep_id for item in request.items}
+    blood_types = {item.blood_type for item in request.items}
+
+    # 1. 참조 데이터 조회 (제제는 기준정보 캐시, 재고는 IN 쿼리 1회)
+    prep_by_id = reference_cache.get(db).preps
+    inv_by_key = {
+        (inv.blood_type, inv.prep_id): inv
+        for inv in db.query(
+            Inventory.id, Inventory.blood_type, Inventory.prep_id, Inventory.current_qty, Inventory.version
+        ).filter(
+            Inventory.prep_id.in_(prep_ids),
+            Inventory.blood_type.in_(blood_types)
+        ).all()
+    }
+
+    # 2. 메모리에서 delta 계산 (같은 셀이 여러 번 오면 순서대로 누적 적용)
+    now = datetime.now()
+    working_qty = {key: inv.current_qty for key, inv in inv_by_key.items()}
+    conflict_keys = set()
+    pending = []   # (item, BloodMaster, previous_qty, delta)
+
     for item in request.items:
-        try:
-            # 제제 정보 조회
-            bm = db.query(BloodMaster).filter(BloodMaster.id == item.prep_id).first()
-            if not bm:
+        bm = prep_by_id.get(item.prep_id)
+        if not bm:
+            results.append(BulkSaveResult(
+                blood_type=item.blood_type, prep_id=item.prep_id,
+                preparation="unknown", previous_qty=0, new_qty=item.qty,
+                delta=0, success=False, error=f"prep_id {item.prep_id} 없음"
+            ))
+            fail_count += 1
+            continue
+
+        key = (item.blood_type, item.prep_id)
+        inv = inv_by_key.get(key)
+        if item.version is not None and item.version != (inv.version if inv else 0):
+            conflict_keys.add(key)  # 클라이언트가 본 이후 다른 사용자가 저장함
+
+        previous_qty = working_qty.get(key, 0)
+        working_qty[key] = item.qty
+        pending.append((item, bm, previous_qty, item.qty - previous_qty))
+
+    # 3. 버전 조건부 일괄 갱신 (조회한 version 기준) → 누락된 행 = 충돌
+    #    수량이 바뀌는 셀만 갱신/version 증가 (재전송된 미변경 셀은 위의 version 확인만 → 다른 사용자 셀을 무효화하지 않음)
+    try:
+        touched = {(item.blood_type, item.prep_id) for item, _, _, delta in pending if delta != 0} - conflict_keys
+        updates = {
+            inv_by_key[key].id: (working_qty[key], inv_by_key[key].version)
+            for key in touched if key in inv_by_key
+        }
+        new_versions = conditional_update_inventory(db, updates, now)
+        conflict_keys.update(
+            key for key in touched if key in inv_by_key and inv_by_key[key].id not in new_versions
+        )
+
+        inventory_inserts = {}   # 재고 행 없음 → 신규 생성 (version 0)
+        stock_logs: list[dict] = []
+        daily_keys = set()       # 당일 마감 재고 스냅샷 대상 (재고가 바뀐 셀)
+
+        for item, bm, previous_qty, delta in pending:
+            key = (item.blood_type, item.prep_id)
+            inv = inv_by_key.get(key)
+
+            if key in conflict_keys:
                 results.append(BulkSaveResult(
                     blood_type=item.blood_type, prep_id=item.prep_id,
-                    preparation="unknown", previous_qty=0, new_qty=item.qty,
-                    delta=0, success=False, error=f"prep_id {item.prep_id} 없음"
+                    preparation=bm.preparation, previous_qty=inv.current_qty if inv else 0,
+                    new_qty=item.qty, delta=0, success=False, conflict=True,
+                    version=inv.version if inv else 0,
+                    error="다른 사용자가 먼저 저장했습니다. 재고를 다시 불러온 후 입력하세요."
                 ))
                 fail_count += 1
                 continue
 
-            # 현재 재고 조회 (없으면 0으로 신규 생성)
-            inv = db.query(Inventory).filter(
-                Inventory.blood_type == item.blood_type,
-                Inventory.prep_id   == item.prep_id
-            ).first()
-
             if inv is None:
-                inv = Inventory(
-                    blood_type=item.blood_type,
-                    prep_id=item.prep_id,
-                    current_qty=0
-                )
-                db.add(inv)
-                db.flush()
-
-            previous_qty = inv.current_qty
-            delta        = item.qty - previous_qty
-            now          = datetime.now()
-
-            # 재고 업데이트 (절대값으로 덮어쓰기 + 서버 타임스탬프)
-            inv.current_qty = item.qty
-            inv.updated_at  = now
+                inventory_inserts[key] = item.qty
+            if delta != 0 or inv is None:
+                daily_keys.add(key)
 
             # 재고 변동이 있을 때만 StockLog 기록
             if delta != 0:
-                log = StockLog(
-                    log_date   = now,
-                    blood_type = item.blood_type,
-                    prep_id    = item.prep_id,
-                    in_qty     = delta  if delta > 0 else 0,
-                    out_qty    = -delta if delta < 0 else 0,
-                    remark     = request.remark or f"{item.blood_type} {bm.preparation} 재고 갱신",
-                    user_id    = request.user_id,
-                    expiry_ok  = request.expiry_ok,
-                    visual_ok  = request.visual_ok
-                )
-                db.add(log)
+                stock_logs.append({
+                    "log_date":   now,
+                    "blood_type": item.blood_type,
+                    "prep_id":    item.prep_id,
+                    "in_qty":     delta  if delta > 0 else 0,
+                    "out_qty":    -delta if delta < 0 else 0,
+                    "remark":     request.remark or f"{item.blood_type} {bm.preparation} 재고 갱신",
+                    "user_id":    request.user_id,
+                    "expiry_ok":  request.expiry_ok,
+                    "visual_ok":  request.visual_ok,
+                    "created_at": now
+                })
 
             results.append(BulkSaveResult(
                 blood_type   = item.blood_type,
@@ -208,21 +309,20 @@ def bulk_save_inventory(request: BulkSaveRequest, background_tasks: BackgroundTa
                 previous_qty = previous_qty,
                 new_qty      = item.qty,
                 delta        = delta,
-                success      = True
+                success      = True,
+                version      = new_versions.get(inv.id, inv.version) if inv else 0
             ))
             success_count += 1
 
-        except Exception as e:
-            db.rollback()
-            results.append(BulkSaveResult(
-                blood_type=item.blood_type, prep_id=item.prep_id,
-                preparation="error", previous_qty=0, new_qty=item.qty,
-                delta=0, success=False, error=str(e)
-            ))
-            fail_count += 1
-
-    # 성공 항목 일괄 커밋
-    try:
+        # 4. 신규 재고 행 / StockLog 일괄 INSERT 후 한 번에 커밋
+        if inventory_inserts:
+            db.execute(insert(Inventory), [
+                {"blood_type": bt, "prep_id": pid, "current_qty": qty, "version": 0, "updated_at": now}
+                for (bt, pid), qty in inventory_inserts.items()
+            ])
+        if stock_logs:
+            db.execute(insert(StockLog), stock_logs)
+        record_daily_levels(db, ((bt, pid, working_qty[(bt, pid)]) for bt, pid in daily_keys), now)
         db.commit()
     except Exception as e:
         db.rollback()
@@ -231,51 +331,31 @@ def bulk_save_inventory(request: BulkSaveRequest, background_tasks: BackgroundTa
             detail=f"DB 커밋 실패: {str(e)}"
         )
 
+    # 재고 스냅샷 캐시에 커밋 결과 반영 (write-through) 후 SSE 구독자에게 발행
+    saved = [r for r in results if r.success]
+    version = inventory_snapshot.apply_changes(
+        (r.blood_type, r.prep_id, r.new_qty, None, r.version) for r in saved
+    )
+    inventory_events.publish_cells(
+        ((r.blood_type, r.prep_id, r.new_qty, r.version) for r in saved if r.delta != 0), version
+    )
+    # 분석 롤업은 응답 후 갱신 (분석 조회는 읽기 전용)
+    if any(r.delta != 0 for r in saved):
+        background_tasks.add_task(refresh_all_rollups)
+
     # ── 위험재고 체크 (RBC 전용) ──────────────────────────────────────────────────
-    from app.database.models import MasterConfig, AlertEmail
+    from app.database.models import AlertEmail
     from app.services.email_service import send_danger_alert
-    import threading
 
     danger_alerts = []  # 프론트에 반환할 위험재고 목록
 
     try:
-        # RBC 계열 BloodMaster ID 조회
-        rbc_preps = db.query(BloodMaster).filter(
-            BloodMaster.preparation.in_(["PRBC", "Pre-R", "Prefiltered"])
-        ).all()
-        rbc_prep_ids = [p.id for p in rbc_preps]
-
-        # 각 혈액형별 RBC 합산 재고 조회
-        for blood_type in ['A', 'B', 'O', 'AB']:
-            total_rbc = db.query(Inventory).filter(
-                Inventory.blood_type == blood_type,
-                Inventory.prep_id.in_(rbc_prep_ids)
-            ).all()
-            qty_sum = sum(i.current_qty for i in total_rbc)
-
-            # MasterConfig에서 danger_factor, dcr 조회
-            mc = db.query(MasterConfig).filter(
-                MasterConfig.blood_type == blood_type,
-                MasterConfig.config_key == 'rbc_factors'
-            ).first()
-
-            if mc and mc.danger_factor and mc.daily_consumption_rate and mc.daily_consumption_rate > 0:
-                dcr = mc.daily_consumption_rate
-                df = mc.danger_factor
-                actual_ratio = round(qty_sum / dcr, 2)
-                danger_threshold_qty = dcr * df
-
-                if qty_sum < danger_threshold_qty:
-                    danger_alerts.append({
-                        "blood_type": blood_type,
-                        "rbc_qty": qty_sum,
-                        "actual_ratio": actual_ratio,
-                        "danger_threshold": df,
-                        "danger_threshold_qty": round(danger_threshold_qty, 1)
-                    })
-
-        # 위험재고가 있으면 이메일 발송 (백그라운드)
+        # 혈액형별 RBC 합산 재고 vs 위험재고 기준 (단일 집계 쿼리)
+        danger_alerts = evaluate_rbc_danger(db)
+
+        # 위험재고가 있으면 SSE 발행 및 이메일 발송 (백그라운드)
         if danger_alerts:
+            inventory_events.publish_danger_alerts(danger_alerts)
             recipients = [e.email for e in db.query(AlertEmail).filter(AlertEmail.is_active == True).all()]
             if recipients:
                 for da in danger_alerts:
@@ -297,69 +377,53 @@ def bulk_save_inventory(request: BulkSaveRequest, background_tasks: BackgroundTa
 from typing import List
 
 @router.post("/upload")
-async def upload_excel_inventory(files: List[UploadFile] = File(...), db: Session = Depends(get_db)):
+async def upload_excel_inventory(
+    files: List[UploadFile] = File(...),
+    run_async: bool = Query(False, alias="async", description="1이면 백그라운드 작업으로 처리하고 작업 ID 즉시 반환"),
+    db: Session = Depends(get_db)
+):
     """
     (통계용) 엑셀 파일(여러 개 가능)을 업로드하여 입고 내역(InboundHistory)에 즉시 저장합니다.
     주의: 이 데이터는 재고량(Inventory)이나 실사로그(StockLog)에 반영되지 않는 순수 통계 데이터입니다.
+
+    - 파일들은 프로세스 풀에서 동시에 파싱 (전체 소요 ≈ 가장 느린 파일)
+    - 성공한 파일의 입고 내역은 한 트랜잭션으로 일괄 저장, 파일별 처리 결과는 files로 반환
+    - 이미 저장된 파일(바이트 SHA-256 일치)은 파싱 없이, 파싱 결과가 같은 파일은 저장 전에 duplicate 처리
+    - 같은 날짜라도 내용이 다른 파일은 저장 (해시 기록 이전의 기존 입고 일자는 날짜 기준으로 거부)
+    - 모든 파일이 실패하면 첫 오류로 응답 (단일 파일 업로드는 기존과 동일)
+    - async=1: 202 + job_id 즉시 응답, 진행률/결과는 GET /api/jobs/{job_id}
     """
-    total_processed = 0
-    total_saved = 0
-    
-    # 혈액제제명 -> prep_id 매핑을 위해 BloodMaster 조회
-    preps = db.query(BloodMaster).all()
-    prep_map = {p.preparation: p.id for p in preps}
-    
-    for file in files:
-        if not file.filename.endswith((".xlsx", ".xls")):
-            continue
-            
-        try:
-            contents = await file.read()
-            result = parse_excel_inventory(contents)
-            
-            # 엑셀에서 추출한 날짜 사용
-            excel_date_str = result.get("record_date")
-            if not excel_date_str:
-                excel_date = datetime.now().date()
-            else:
-                excel_date = datetime.strptime(excel_date_str, "%Y-%m-%d").date()
-            
-            # 중복 체크: 해당 날짜의 입고 내역이 이미 있는지 확인
-            existing_count = db.query(InboundHistory).filter(InboundHistory.receive_date == excel_date).count()
-            if existing_count > 0:
-                raise ValueError(f"이미 {excel_date} 날짜의 입고 내역이 존재합니다. 중복 업로드를 방지하기 위해 처리를 중단합니다.")
-
-            total_processed += 1
-            
-            for item in result["items"]:
-                if item["is_mapped"] and item["preparation"] in prep_map:
-                    inbound_record = InboundHistory(
-                        receive_date=excel_date,
-                        blood_type=item["blood_type"],
-                        prep_id=prep_map[item["preparation"]],
-                        qty=item["qty"]
-                    )
-                    db.add(inbound_record)
-                    total_saved += item["qty"]
-                    
-        except ValueError as e:
-            db.rollback()
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
-        except Exception as e:
-            db.rollback()
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"엑셀 파일({file.filename}) 처리 중 오류: {str(e)}"
-            )
-            
-    db.commit()
-    
-    return {
-        "message": "입고 통계 저장 완료",
-        "files_processed": total_processed,
-        "total_qty_saved": total_saved,
-        "date": excel_date.strftime("%Y-%m-%d") if total_processed > 0 else None
-    }
+    excel_files = [f for f in files if f.filename.endswith((".xlsx", ".xls"))]
+
+    if run_async:
+        job = await create_upload_job(db, excel_files)
+        start_upload_job(job.id)
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={
+            "job_id": job.id,
+            "status": job.status,
+            "total_files": job.total_files,
+            "status_url": f"/api/jobs/{job.id}"
+        })
+
+    # 업로드를 임시 파일로 스풀 후 워커가 read-only 스트리밍으로 파싱 (파일 전체를 메모리에 두지 않음)
+    # 스풀하면서 계산한 SHA-256으로 이미 저장된 파일은 파싱하지 않음
+    filenames = [f.filename for f in excel_files]
+    paths, hashes = [], []
+    try:
+        for file in excel_files:
+            path, sha256 = await spool_upload(file, suffix=os.path.splitext(file.filename)[1])
+            paths.append(path)
+            hashes.append(sha256)
+        skip = await run_in_threadpool(find_duplicate_uploads, db, filenames, hashes)
+        parsed = await parse_uploaded_files(paths, skip=skip)
+    finally:
+        for path in paths:
+            os.unlink(path)
+
+    try:
+        return await run_in_threadpool(save_inbound_uploads, db, filenames, parsed, hashes)
+    except InboundUploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
 
 @router.get("/logs")
 def get_audit_logs(limit: int = 100, db: Session = Depends(get_db)):
@@ -0,0 +1,26 @@
+"""
+Background job status API (엑셀 업로드 작업 진행률/결과)
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.database.database import get_db
+from app.database.models import UploadJob
+from app.services.upload_jobs import job_to_dict
+
+router = APIRouter(prefix="/api/jobs", tags=["Jobs"])
+
+
+@router.get("/{job_id}")
+def get_job(job_id: str, db: Session = Depends(get_db)):
+    """
+    작업 상태 조회
+
+    - status: queued / running / done / failed
+    - processed_files / total_files: 파싱 완료 파일 수
+    - result: 완료 시 업로드 응답 (파일별 결과 files 포함), error: 실패 사유
+    """
+    job = db.query(UploadJob).filter(UploadJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="작업을 찾을 수 없습니다.")
+    return job_to_dict(job)
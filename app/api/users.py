@@ -1,17 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from typing import List
 
 from app.database.database import get_db
 from app.database.models import User
 from app.schemas.schemas import UserResponse, UserCreate, UserUpdate, UserPasswordReset
 from app.core.security import hash_password
+from app.core.etag import make_etag, is_not_modified, set_etag, not_modified
 
 router = APIRouter(prefix="/api/users", tags=["Users"])
 
 @router.get("/", response_model=List[UserResponse])
-def get_users(db: Session = Depends(get_db)):
-    """모든 사용자 목록 조회"""
+def get_users(request: Request, response: Response, db: Session = Depends(get_db)):
+    """모든 사용자 목록 조회 - (행 수, 최대 ID, 최종 수정일시)를 ETag로 반환, 일치 시 304"""
+    count, max_id, last_updated = db.query(
+        func.count(User.id), func.max(User.id), func.max(User.updated_at)
+    ).one()
+    etag = make_etag("users", count, max_id, last_updated)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
     users = db.query(User).all()
     return users
 
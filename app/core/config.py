@@ -24,6 +24,29 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 24 hours
     
+    # In-process cache
+    INVENTORY_CACHE_TTL_SECONDS: int = 300  # 재고 스냅샷 안전망 TTL (다중 워커 대비)
+    REFERENCE_CACHE_TTL_SECONDS: int = 600  # 기준정보(제제/적정재고/마스터설정) 캐시 TTL
+    ANALYTICS_CACHE_MAX_ENTRIES: int = 64  # 분석 결과 LRU 캐시 최대 항목 수
+
+    # 분석 롤업 (inventory_rollup)
+    ROLLUP_HOUR_RETENTION_DAYS: int = 92  # 시간 단위 롤업 생성 범위 (일)
+
+    # 이력 내보내기 (Parquet/Arrow)
+    EXPORT_BATCH_SIZE: int = 10000  # 서버 측 커서 배치 크기 (행) = Parquet row group 크기
+
+    # 엑셀 업로드 (입고 통계)
+    UPLOAD_SPOOL_CHUNK_BYTES: int = 1024 * 1024  # 업로드 → 임시 파일 기록 단위
+    EXCEL_STREAM_CHUNK_ROWS: int = 5000  # 스트리밍 파싱 시 한 번에 매핑/집계하는 행 수
+    UPLOAD_JOB_DIR: str = ""  # 백그라운드 업로드 파싱용 작업 디렉터리 (빈 값 = 시스템 임시 디렉터리, 원본은 DB 보관)
+    UPLOAD_JOB_MAX_ATTEMPTS: int = 3  # 재시작 재개 포함 작업당 최대 실행 횟수
+    UPLOAD_JOB_RETENTION_DAYS: int = 7  # 완료/실패 작업 기록 보관 기간
+
+    # CPU 작업 프로세스 풀 (분석/엑셀 파싱)
+    CPU_POOL_WORKERS: int = 2  # 0 = 풀 미사용 (요청 스레드에서 직접 실행)
+    CPU_POOL_MAX_PENDING: int = 8  # 대기+실행 작업 상한 (초과 시 503)
+    CPU_TASK_TIMEOUT_SECONDS: float = 60.0  # 작업별 타임아웃 (초과 시 504)
+    
     # SMTP Settings (Gmail)
     SMTP_HOST: str = "smtp.gmail.com"
     SMTP_PORT: int = 587
@@ -0,0 +1,50 @@
+"""
+ETag / If-None-Match 조건부 GET 지원
+- 리소스별 데이터 버전(변경 카운터 또는 updated_at 집계)으로 약한 ETag 생성
+- 클라이언트가 보낸 If-None-Match와 일치하면 본문 없이 304 응답
+"""
+import hashlib
+import uuid
+from typing import Optional
+
+from fastapi import Request, Response
+
+# 프로세스별 식별자: 프로세스 메모리 카운터 기반 버전이 다른 워커/재시작 후와 충돌하지 않도록 함
+PROCESS_TOKEN = uuid.uuid4().hex[:8]
+
+
+def make_etag(resource: str, *version_parts) -> str:
+    """리소스 이름 + 버전 구성요소로 약한 ETag 생성"""
+    raw = "|".join([resource, *(str(p) for p in version_parts)])
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+    return f'W/"{digest}"'
+
+
+def _normalize(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """If-None-Match 헤더가 현재 ETag와 일치하는지 (약한 비교)"""
+    header: Optional[str] = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    current = _normalize(etag)
+    return any(_normalize(t) == current for t in header.split(","))
+
+
+def set_etag(response: Response, etag: str) -> None:
+    """200 응답에 ETag 및 재검증 정책 헤더 설정"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+
+
+def not_modified(etag: str) -> Response:
+    """본문 없는 304 응답"""
+    return Response(
+        status_code=304,
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
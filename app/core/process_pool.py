@@ -0,0 +1,133 @@
+"""
+CPU 작업용 프로세스 풀 - pandas 분석/엑셀 파싱을 요청 스레드(GIL) 밖에서 실행
+- 대기 중+실행 중 작업 수 상한(CPU_POOL_MAX_PENDING) 초과 시 즉시 CpuPoolBusyError (→ 503)
+- 작업별 타임아웃(CPU_TASK_TIMEOUT_SECONDS) 초과 시 CpuTaskTimeoutError (→ 504)
+- CPU_POOL_WORKERS=0 이면 풀 없이 호출 스레드에서 직접 실행
+- 실행 함수/인자/결과는 pickle 가능해야 함 (DB 세션 등은 전달 불가)
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+import logging
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class CpuPoolBusyError(RuntimeError):
+    """대기 작업 수 상한 초과"""
+
+
+class CpuTaskTimeoutError(TimeoutError):
+    """작업 타임아웃"""
+
+
+class CpuTaskPool:
+    """대기열 상한과 타임아웃이 있는 프로세스 풀 (지연 생성, thread-safe)"""
+
+    def __init__(self, max_workers: int, max_pending: int, timeout_seconds: float):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout_seconds = timeout_seconds
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: int = 0
+        self.completed: int = 0
+        self.rejected: int = 0
+        self.timed_out: int = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_workers > 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: 부모의 DB 커넥션/스레드 상태를 복제하지 않음
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def _release(self, _future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """작업 제출 (상한 초과 시 CpuPoolBusyError)"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise CpuPoolBusyError("분석 작업이 많아 잠시 후 다시 시도해 주세요.")
+            try:
+                future = self._get_executor().submit(fn, *args)
+            except BrokenProcessPool:
+                # 워커 프로세스 비정상 종료 → 풀 재생성 후 1회 재시도
+                logger.warning("CPU 프로세스 풀 재생성 (broken pool)")
+                self._executor = None
+                future = self._get_executor().submit(fn, *args)
+            self._pending += 1
+        future.add_done_callback(self._release)
+        return future
+
+    def run_sync(self, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """동기 핸들러(threadpool)용: 결과가 나올 때까지 블록 (GIL은 점유하지 않음)"""
+        if not self.enabled:
+            return fn(*args)
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout=timeout or self.timeout_seconds)
+        except FutureTimeoutError:
+            self._on_timeout(future)
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """async 핸들러용: 이벤트 루프를 막지 않고 결과를 await"""
+        if not self.enabled:
+            return await run_in_threadpool(fn, *args)
+        future = self.submit(fn, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout_seconds)
+        except asyncio.TimeoutError:
+            self._on_timeout(future)
+
+    def _on_timeout(self, future: Future) -> None:
+        # 대기열에 있던 작업만 취소 가능 (실행 중인 작업은 끝날 때까지 상한에 계속 포함)
+        future.cancel()
+        with self._lock:
+            self.timed_out += 1
+        raise CpuTaskTimeoutError("처리 시간이 초과되었습니다.")
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'started': self._executor is not None,
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'timeout_seconds': self.timeout_seconds,
+            }
+
+
+cpu_pool = CpuTaskPool(
+    max_workers=settings.CPU_POOL_WORKERS,
+    max_pending=settings.CPU_POOL_MAX_PENDING,
+    timeout_seconds=settings.CPU_TASK_TIMEOUT_SECONDS
+)
@@ -0,0 +1,72 @@
+"""
+Single-flight 요청 병합
+- 같은 키의 계산이 진행 중이면 새 호출은 계산을 시작하지 않고 진행 중인 결과를 기다려 공유
+- 동기 핸들러(threadpool) 용: threading 기반, 예외도 대기자 모두에게 전파
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters: int = 0
+
+
+class SingleFlight:
+    """키별 진행 중 계산을 하나로 병합 (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.leaders: int = 0
+        self.coalesced: int = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any],
+           before_wait: Optional[Callable[[], None]] = None) -> Any:
+        """
+        key에 대한 fn() 결과 반환 - 진행 중인 동일 키 계산이 있으면 그 결과를 공유
+
+        Args:
+            before_wait: 대기자가 되었을 때 기다리기 전에 호출 (예: DB 커넥션 반납)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            if before_wait is not None:
+                before_wait()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            in_flight = len(self._calls)
+            return {
+                'in_flight': in_flight,
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+            }
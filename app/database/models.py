@@ -2,10 +2,14 @@
 Database Models for SCHBC BBMS
 - MasterConfig: blood_type/prep_id별 별도 행 (daily_consumption_rate, safety_factor)
 - InventoryRatioHistory: 적정재고비 변경 히스토리
+- InventoryDailySnapshot: 일자별 마감 재고 (분석용, 재고 변동 시 증분 갱신)
+- InventoryRollup: 시간/일/주/월 재고 롤업 (분석용, 재고 변동 후 백그라운드로 열린 구간부터 증분 재계산)
+- UploadJob: 엑셀 업로드 백그라운드 작업 (진행률/결과, 재시작 시 재개)
+- InboundUploadDigest: 저장된 입고 엑셀 파일 해시 (중복 업로드 차단)
 """
 from datetime import datetime
 from math import ceil
-from sqlalchemy import Column, Integer, String, Float, DateTime, Date, ForeignKey, Text, UniqueConstraint, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, Date, ForeignKey, Text, UniqueConstraint, Boolean, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -140,6 +144,7 @@ class Inventory(Base):
     blood_type = Column(String(5), nullable=False, comment='혈액형 (A, B, O, AB)')
     prep_id = Column(Integer, ForeignKey('blood_master.id'), nullable=False, comment='제제 ID')
     current_qty = Column(Integer, nullable=False, default=0, comment='현재재고량')
+    version = Column(Integer, nullable=False, default=0, server_default='0', comment='낙관적 동시성 버전 (변경 시 +1)')
     remark = Column(Text, comment='비고')
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, comment='수정일시')
 
@@ -158,7 +163,7 @@ class StockLog(Base):
     __tablename__ = 'stock_log'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    log_date = Column(DateTime, nullable=False, default=datetime.now, comment='로그일시')
+    log_date = Column(DateTime, nullable=False, default=datetime.now, index=True, comment='로그일시')
     blood_type = Column(String(5), nullable=False, comment='혈액형 (A, B, O, AB)')
     prep_id = Column(Integer, ForeignKey('blood_master.id'), nullable=False, comment='제제 ID')
     in_qty = Column(Integer, nullable=False, default=0, comment='입고량')
@@ -178,6 +183,48 @@ class StockLog(Base):
         return f"<StockLog({self.blood_type}, in={self.in_qty}, out={self.out_qty})>"
 
 
+class InventoryDailySnapshot(Base):
+    """(통계용) 일자별 마감 재고 스냅샷 - 재고 변동이 있는 날만 행 생성, 없는 날은 직전 행 유지"""
+    __tablename__ = 'inventory_daily_snapshot'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    snapshot_date = Column(Date, nullable=False, index=True, comment='기준일자')
+    blood_type = Column(String(5), nullable=False, comment='혈액형')
+    prep_id = Column(Integer, ForeignKey('blood_master.id'), nullable=False, comment='제제 ID')
+    qty = Column(Integer, nullable=False, default=0, comment='마감 재고량')
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, comment='수정일시')
+
+    __table_args__ = (
+        UniqueConstraint('blood_type', 'prep_id', 'snapshot_date', name='uix_daily_snapshot_cell_date'),
+    )
+
+    def __repr__(self):
+        return f"<InventoryDailySnapshot(date={self.snapshot_date}, {self.blood_type}, prep={self.prep_id}, qty={self.qty})>"
+
+
+class InventoryRollup(Base):
+    """(통계용) 시간/일/주/월 단위 재고 롤업 - 구간별 재고 최소/평균(시간가중)/최대 및 입출고 합계 (inventory_daily_snapshot에서 파생)"""
+    __tablename__ = 'inventory_rollup'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    resolution = Column(String(10), nullable=False, comment='집계 단위 (hour, day, week, month)')
+    bucket_start = Column(DateTime, nullable=False, comment='구간 시작일시')
+    blood_type = Column(String(5), nullable=False, comment='혈액형')
+    prep_id = Column(Integer, ForeignKey('blood_master.id'), nullable=False, comment='제제 ID')
+    min_qty = Column(Integer, nullable=False, default=0, comment='구간 최소 재고')
+    avg_qty = Column(Float, nullable=False, default=0, comment='구간 평균 재고 (시간가중)')
+    max_qty = Column(Integer, nullable=False, default=0, comment='구간 최대 재고')
+    in_qty = Column(Integer, nullable=False, default=0, comment='구간 입고 합계')
+    out_qty = Column(Integer, nullable=False, default=0, comment='구간 출고 합계')
+
+    __table_args__ = (
+        UniqueConstraint('resolution', 'bucket_start', 'blood_type', 'prep_id', name='uix_inventory_rollup'),
+    )
+
+    def __repr__(self):
+        return f"<InventoryRollup({self.resolution} {self.bucket_start}, {self.blood_type}, prep={self.prep_id}, avg={self.avg_qty})>"
+
+
 # ==================== Inbound ====================
 
 class InboundHistory(Base):
@@ -197,6 +244,55 @@ class InboundHistory(Base):
         return f"<InboundHistory(date={self.receive_date}, {self.blood_type}, prep={self.prep_id}, qty={self.qty})>"
 
 
+class InboundUploadDigest(Base):
+    """(통계용) 입고 내역으로 저장된 엑셀 파일의 SHA-256 (파일 바이트 / 정규화된 파싱 결과)"""
+    __tablename__ = 'inbound_upload_digest'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    file_sha256 = Column(String(64), nullable=False, unique=True, comment='파일 바이트 SHA-256')
+    content_sha256 = Column(String(64), nullable=False, unique=True, comment='파싱 결과(일자+혈액형/제제/수량) SHA-256')
+    filename = Column(String(255), nullable=True, comment='업로드 파일명')
+    receive_date = Column(Date, nullable=False, index=True, comment='입고일자 (엑셀기준)')
+    qty = Column(Integer, nullable=False, default=0, comment='저장된 총 수량')
+    created_at = Column(DateTime, default=datetime.now, comment='업로드일시')
+
+    def __repr__(self):
+        return f"<InboundUploadDigest({self.filename}, date={self.receive_date}, {self.file_sha256[:12]})>"
+
+
+class UploadJob(Base):
+    """(통계용) 엑셀 업로드 백그라운드 작업 - 진행 상태/파일별 결과 보관"""
+    __tablename__ = 'upload_job'
+
+    id = Column(String(32), primary_key=True, comment='작업 ID (uuid hex)')
+    status = Column(String(20), nullable=False, default='queued', index=True, comment='queued / running / done / failed')
+    files = Column(Text, nullable=False, comment='파일 목록 JSON [{filename, path, sha256}] (path는 파싱용 작업 사본)')
+    total_files = Column(Integer, nullable=False, default=0, comment='전체 파일 수')
+    processed_files = Column(Integer, nullable=False, default=0, comment='파싱 완료 파일 수')
+    attempts = Column(Integer, nullable=False, default=0, comment='실행 시도 횟수 (실행 선점용)')
+    result = Column(Text, nullable=True, comment='완료 결과 JSON (업로드 응답과 동일)')
+    error = Column(Text, nullable=True, comment='실패 사유')
+    created_at = Column(DateTime, default=datetime.now, comment='생성일시')
+    started_at = Column(DateTime, nullable=True, comment='시작일시')
+    finished_at = Column(DateTime, nullable=True, comment='종료일시')
+
+    def __repr__(self):
+        return f"<UploadJob({self.id}, {self.status}, {self.processed_files}/{self.total_files})>"
+
+
+class UploadJobFile(Base):
+    """(통계용) 업로드 작업 원본 파일 - 재시작 후 재실행용 (작업 완료/실패 시 삭제)"""
+    __tablename__ = 'upload_job_file'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(String(32), ForeignKey('upload_job.id', ondelete='CASCADE'), nullable=False, index=True, comment='작업 ID')
+    seq = Column(Integer, nullable=False, comment='파일 순번 (upload_job.files 순서)')
+    content = Column(LargeBinary, nullable=False, comment='파일 원본')
+
+    def __repr__(self):
+        return f"<UploadJobFile({self.job_id}, {self.seq})>"
+
+
 # ==================== Helper ====================
 
 class SystemSettings(Base):
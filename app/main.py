@@ -1,6 +1,7 @@
 """
 SCHBC BBMS FastAPI Application - Standalone (Railway 직접 서빙)
 """
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
@@ -9,7 +10,7 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import logging
 
-from app.api import auth, inventory, config, users, analytics
+from app.api import auth, inventory, config, users, analytics, jobs
 from app.api import admin as admin_api
 from app.api import alert_email as alert_email_api
 from app.core.config import settings
@@ -37,14 +38,35 @@ async def lifespan(app: FastAPI):
             db.execute(text("ALTER TABLE stock_log ADD COLUMN IF NOT EXISTS expiry_ok BOOLEAN DEFAULT TRUE;"))
             db.execute(text("ALTER TABLE stock_log ADD COLUMN IF NOT EXISTS visual_ok BOOLEAN DEFAULT TRUE;"))
             db.execute(text("ALTER TABLE master_config ADD COLUMN IF NOT EXISTS danger_factor FLOAT;"))
+            db.execute(text("ALTER TABLE inventory ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0;"))
+            db.execute(text("CREATE INDEX IF NOT EXISTS ix_stock_log_log_date ON stock_log (log_date);"))
             db.commit()
-            db.close()
             logger.info("✅ DB 스키마 마이그레이션 확인 (stock_log 확장 필드 및 신규 테이블 확인)")
+            # 기준정보 캐시 선적재
+            from app.services.reference_cache import reference_cache
+            reference_cache.get(db)
+            logger.info("✅ 기준정보 캐시 적재 완료")
+            # 일자별 마감 재고 스냅샷이 비어 있으면 이력에서 백필 (분석 조회 전에 완료)
+            from app.services.daily_snapshot_service import ensure_daily_snapshots
+            backfilled = ensure_daily_snapshots(db)
+            if backfilled:
+                logger.info(f"✅ 일자별 재고 스냅샷 백필 {backfilled}행")
+            # 재시작 전 미완료 엑셀 업로드 작업 재개
+            from app.services.upload_jobs import resume_upload_jobs
+            resumed = resume_upload_jobs(db)
+            db.close()
+            if resumed:
+                logger.info(f"✅ 미완료 업로드 작업 {resumed}건 재개")
+            # 분석 롤업을 마지막 저장 구간부터 따라잡기 (기동을 막지 않도록 스레드에서)
+            from app.services.rollup_service import refresh_all_rollups
+            asyncio.get_running_loop().run_in_executor(None, refresh_all_rollups)
         except Exception as e:
             logger.error(f"⚠️ DB 스키마 자동 패치 실패: {e}")
     else:
         logger.warning("⚠️ DB 연결 실패 - DATABASE_URL 확인 필요")
     yield
+    from app.core.process_pool import cpu_pool
+    cpu_pool.shutdown()
     logger.info("👋 SCHBC BBMS 종료")
 
 
@@ -72,6 +94,7 @@ app.include_router(inventory.router)
 app.include_router(config.router, prefix="/api/config", tags=["Configuration"])
 app.include_router(users.router)
 app.include_router(analytics.router)
+app.include_router(jobs.router)
 app.include_router(admin_api.router)
 app.include_router(alert_email_api.router, tags=["Alert Emails"])
 
@@ -64,6 +64,7 @@ class InventoryItem(BaseModel):
     preparation: str = Field(..., description="제제명")
     component: str = Field(..., description="혈액성분")
     current_qty: int = Field(..., description="현재재고량")
+    version: int = Field(0, description="재고 버전 (bulk-save 시 그대로 전달)")
     safety_qty: int = Field(..., description="적정재고량")
     alert_threshold: int = Field(..., description="알람기준량")
     target_qty: Optional[int] = Field(None, description="목표재고량 (RBC 전용)")
@@ -111,6 +112,7 @@ class BulkSaveItem(BaseModel):
     blood_type: str  = Field(..., description="혈액형 (A/B/O/AB)")
     prep_id:    int  = Field(..., ge=1, description="제제 ID (BloodMaster.id)")
     qty:        int  = Field(..., ge=0, description="사용자가 입력한 현재 재고 수량(절대값)")
+    version:    Optional[int] = Field(None, ge=0, description="조회 시점 재고 버전 (불일치 시 충돌로 거부)")
 
 class BulkSaveRequest(BaseModel):
     """Matrix 전체 한 번에 저장 요청"""
@@ -130,6 +132,8 @@ class BulkSaveResult(BaseModel):
     delta:        int   # new_qty - previous_qty (양수=입고, 음수=출고)
     success:      bool
     error:        Optional[str] = None
+    version:      Optional[int] = None   # 저장 후 재고 버전 (충돌 시 서버의 현재 버전)
+    conflict:     bool = False           # 다른 사용자가 먼저 저장하여 거부됨
 
 class BulkSaveResponse(BaseModel):
     """Bulk Save 전체 결과"""
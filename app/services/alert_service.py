@@ -2,14 +2,19 @@
 재고 관리 서비스 - Alert 체크 기능 추가
 """
 from sqlalchemy.orm import Session
-from typing import Dict, Optional
+from sqlalchemy import func
+from typing import Dict, List, Optional
 import logging
 
-from app.database.models import Inventory, BloodMaster, SafetyConfig
+from app.database.models import Inventory, BloodMaster, SafetyConfig, MasterConfig
+from app.services.reference_cache import reference_cache
 
 
 logger = logging.getLogger(__name__)
 
+BLOOD_TYPES = ['A', 'B', 'O', 'AB']
+DANGER_RBC_PREPS = ['PRBC', 'Pre-R', 'Prefiltered']  # 위험재고 합산 대상 RBC 제제명
+
 
 def check_blood_type_rbc_alert(db: Session, blood_type: str) -> Optional[Dict]:
     """
@@ -22,37 +27,29 @@ def check_blood_type_rbc_alert(db: Session, blood_type: str) -> Optional[Dict]:
     Returns:
         알림이 필요한 경우 알림 데이터, 아니면 None
     """
+    refs = reference_cache.get(db)
+
     # PRBC와 Prefiltered 제제 조회
-    prbc = db.query(BloodMaster).filter(BloodMaster.preparation == 'PRBC').first()
-    prefiltered = db.query(BloodMaster).filter(BloodMaster.preparation == 'Prefiltered').first()
+    prbc = refs.prep_by_name('PRBC')
+    prefiltered = refs.prep_by_name('Prefiltered')
     
     if not prbc or not prefiltered:
         logger.warning(f"RBC preparations not found in BloodMaster")
         return None
     
-    # 해당 혈액형의 RBC 재고 조회
-    prbc_inv = db.query(Inventory).filter(
+    # 해당 혈액형의 RBC 재고 조회 (PRBC + Prefiltered 한 번에)
+    rbc_qty = dict(db.query(Inventory.prep_id, Inventory.current_qty).filter(
         Inventory.blood_type == blood_type,
-        Inventory.prep_id == prbc.id
-    ).first()
-    
-    prefiltered_inv = db.query(Inventory).filter(
-        Inventory.blood_type == blood_type,
-        Inventory.prep_id == prefiltered.id
-    ).first()
+        Inventory.prep_id.in_([prbc.id, prefiltered.id])
+    ).all())
+    prbc_qty = rbc_qty.get(prbc.id, 0)
+    prefiltered_qty = rbc_qty.get(prefiltered.id, 0)
     
     # RBC 총 재고 계산
-    total_rbc_qty = 0
-    if prbc_inv:
-        total_rbc_qty += prbc_inv.current_qty
-    if prefiltered_inv:
-        total_rbc_qty += prefiltered_inv.current_qty
+    total_rbc_qty = prbc_qty + prefiltered_qty
     
     # 알림 기준 조회 (PRBC 기준 사용)
-    safety_config = db.query(SafetyConfig).filter(
-        SafetyConfig.blood_type == blood_type,
-        SafetyConfig.prep_id == prbc.id
-    ).first()
+    safety_config = refs.safety(blood_type, prbc.id)
     
     if not safety_config:
         logger.warning(f"Safety config not found for {blood_type} PRBC")
@@ -65,8 +62,8 @@ def check_blood_type_rbc_alert(db: Session, blood_type: str) -> Optional[Dict]:
             'preparation': 'RBC (PRBC + Prefiltered)',
             'current_qty': total_rbc_qty,
             'threshold': safety_config.alert_threshold,
-            'prbc_qty': prbc_inv.current_qty if prbc_inv else 0,
-            'prefiltered_qty': prefiltered_inv.current_qty if prefiltered_inv else 0
+            'prbc_qty': prbc_qty,
+            'prefiltered_qty': prefiltered_qty
         }
         
         logger.info(f"Alert triggered for {blood_type} RBC: {total_rbc_qty} < {safety_config.alert_threshold}")
@@ -96,16 +93,15 @@ def check_single_item_alert(db: Session, blood_type: str, prep_id: int) -> Optio
     if not inventory:
         return None
     
+    refs = reference_cache.get(db)
+
     # 제제 정보 조회
-    blood_master = db.query(BloodMaster).filter(BloodMaster.id == prep_id).first()
+    blood_master = refs.prep(prep_id)
     if not blood_master:
         return None
     
     # 안전 재고 설정 조회
-    safety_config = db.query(SafetyConfig).filter(
-        SafetyConfig.blood_type == blood_type,
-        SafetyConfig.prep_id == prep_id
-    ).first()
+    safety_config = refs.safety(blood_type, prep_id)
     
     if not safety_config:
         return None
@@ -125,3 +121,42 @@ def check_single_item_alert(db: Session, blood_type: str, prep_id: int) -> Optio
         return alert_data
     
     return None
+
+
+def evaluate_rbc_danger(db: Session) -> List[Dict]:
+    """
+    혈액형별 RBC 합산 재고가 위험재고(DCR x DF) 미만인지 일괄 판정
+
+    RBC 재고는 GROUP BY blood_type 집계 한 번으로 가져오고, 혈액형별 rbc_factors
+    설정(prep_id=NULL 행)은 기준정보 캐시에서 읽는다. RBC 재고 행이 없는 혈액형은 0으로 본다.
+
+    Returns:
+        위험재고 발생 혈액형 목록 (A, B, O, AB 순)
+    """
+    refs = reference_cache.get(db)
+    rbc_prep_ids = refs.prep_ids(DANGER_RBC_PREPS)
+
+    rbc_totals = dict(db.query(
+        Inventory.blood_type, func.sum(Inventory.current_qty)
+    ).filter(
+        Inventory.prep_id.in_(rbc_prep_ids)
+    ).group_by(Inventory.blood_type).all())
+
+    danger_alerts = []
+    for blood_type in BLOOD_TYPES:
+        mc = refs.config('rbc_factors', blood_type)
+        if not (mc and mc.danger_factor and mc.daily_consumption_rate and mc.daily_consumption_rate > 0):
+            continue
+        dcr = mc.daily_consumption_rate
+        df = mc.danger_factor
+        qty_sum = int(rbc_totals.get(blood_type) or 0)
+        danger_threshold_qty = dcr * df
+        if qty_sum < danger_threshold_qty:
+            danger_alerts.append({
+                "blood_type": blood_type,
+                "rbc_qty": qty_sum,
+                "actual_ratio": round(qty_sum / dcr, 2),
+                "danger_threshold": df,
+                "danger_threshold_qty": round(danger_threshold_qty, 1)
+            })
+    return danger_alerts
@@ -0,0 +1,90 @@
+"""
+분석 결과 캐시 - /api/analytics 용 프로세스 내 LRU 캐시
+
+- 키: (start, end, 데이터 워터마크) - 워터마크는 StockLog/InboundHistory/InventoryRollup 최대 ID,
+  재고 세대(Inventory 행 수, version 합계)와 기준정보 캐시 버전
+- 새 로그/입고가 기록되거나 롤업이 (백그라운드로) 갱신되거나 재고 수량이 바뀌거나(로그 없는 초기화 포함)
+  기준정보가 바뀌면 워터마크가 달라져 자연히 미스 (명시적 무효화 불필요)
+- 항목 수 상한(ANALYTICS_CACHE_MAX_ENTRIES)을 넘으면 가장 오래 조회되지 않은 항목부터 제거
+- 캐시된 결과 dict는 여러 요청이 공유하므로 호출자는 수정하지 않음
+- 동시에 같은 키로 미스가 나면 analytics_flights로 계산을 하나로 병합
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+import logging
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.singleflight import SingleFlight
+from app.database.models import InboundHistory, Inventory, InventoryRollup, StockLog
+from app.services.reference_cache import reference_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+def data_watermark(db: Session) -> tuple:
+    """분석 결과에 영향을 주는 데이터 버전 (조회 1회 - PK 인덱스 + 셀 수만큼의 inventory)"""
+    reference_cache.get(db)  # 기준정보가 적재된 뒤의 세대(version)로 키를 만듦
+    row = db.execute(select(
+        select(func.max(StockLog.id)).scalar_subquery(),
+        select(func.max(InboundHistory.id)).scalar_subquery(),
+        select(func.max(InventoryRollup.id)).scalar_subquery(),
+        # 재고 세대: 수량이 바뀌면 해당 셀 version이 증가 → 합계가 항상 증가 (max는 그대로일 수 있음)
+        select(func.count(Inventory.id)).scalar_subquery(),
+        select(func.sum(Inventory.version)).scalar_subquery()
+    )).one()
+    return (*row, reference_cache.version)
+
+
+class AnalyticsResultCache:
+    """크기 제한 LRU 결과 캐시 (thread-safe)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: Hashable, result: Dict) -> None:
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+analytics_results = AnalyticsResultCache(max_entries=settings.ANALYTICS_CACHE_MAX_ENTRIES)
+analytics_flights = SingleFlight()
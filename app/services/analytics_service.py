@@ -1,193 +1,387 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from app.database.models import Inventory, StockLog, BloodMaster, SafetyConfig, MasterConfig, InboundHistory
+from app.services.reference_cache import reference_cache
+from app.core.process_pool import cpu_pool
+from app.services.analytics_cache import analytics_flights, analytics_results, data_watermark
+from app.services.rollup_service import (
+    RESOLUTIONS, BUCKET_LABEL_FORMAT, ROLLUP_COLUMNS, bucket_floor, hour_retention_start, load_rollups
+)
 
-def get_analytics_data(db: Session, start_date: str, end_date: str):
+BLOOD_TYPES = ['A', 'B', 'O', 'AB']
+STOCK_KEY_NAMES = ['blood_type', 'prep_id']
+GRANULARITIES = ('auto', 'event') + RESOLUTIONS
+# auto 선택 기준: 조회 일수 상한 → 해상도 (초과 시 month)
+AUTO_GRANULARITY_MAX_DAYS = [(31, 'event'), (92, 'day'), (731, 'week')]
+
+
+def reconstruct_stock_levels(df_logs: pd.DataFrame, current_stock: dict, now_label: str) -> pd.DataFrame:
     """
-    지정된 기간 동안의 분석 데이터를 생성합니다.
-    - RBC 추이 (PRBC + Pre-R 합산)
-    - FFP 추이
-    - 요약 카드 데이터 (기간 내 입고량, 최소 재고, 평균 재고)
-    - 목표 미달 경고 내역
+    현재 재고에서 StockLog를 거꾸로 되감아 변경점별 재고 수준을 계산합니다.
+
+    - 로그는 분 단위 시점 라벨로 묶고, (시점 × 혈액형/제제) delta 행렬을 만든 뒤
+      역방향 누적합으로 "해당 시점 포함 이후 변동 합계"를 구해 현재 재고에서 뺍니다.
+    - 각 시점 값은 그 시점의 변경이 반영되기 전 재고(기존 역산과 동일), 마지막 행(now_label)은 현재 재고.
+    - 현재 Inventory에 없는 셀(로그만 있는 혈액형/제제)은 현재 재고 0으로 간주해 함께 역산
+      (기존 역산처럼 해당 로그 시점도 차트에 포함).
+    - 음수 보정은 기존 역산과 같이 되감는 도중 누적 적용 (재고 = max(0, 다음 재고 - delta)):
+      닫힌 형태 max(현재, 이후 변동 합계의 역방향 누적 최대) - 이후 변동 합계로 계산.
+
+    Args:
+        df_logs: log_date(datetime64), blood_type, prep_id, delta 컬럼
+        current_stock: (blood_type, prep_id) → df_logs 마지막 로그 이후 시점의 수량 (보통 현재 재고)
+
+    Returns:
+        index=시점 라벨('%Y-%m-%d %H:%M', 오름차순), columns=MultiIndex(blood_type, prep_id)
+    """
+    current_stock = dict(current_stock)
+    if not df_logs.empty:
+        for key in df_logs[['blood_type', 'prep_id']].drop_duplicates().itertuples(index=False, name=None):
+            current_stock.setdefault(key, 0)
+    columns = pd.MultiIndex.from_tuples(list(current_stock), names=STOCK_KEY_NAMES)
+    current = np.array(list(current_stock.values()), dtype='int64')
+
+    if df_logs.empty:
+        deltas = np.zeros((0, len(columns)), dtype='int64')
+        labels = []
+    else:
+        col_pos = columns.get_indexer(pd.MultiIndex.from_arrays([df_logs['blood_type'], df_logs['prep_id']]))
+        pivot = pd.Series(
+            df_logs['delta'].to_numpy(dtype='int64'),
+            index=pd.MultiIndex.from_arrays([df_logs['log_date'].dt.floor('min'), col_pos])
+        ).groupby(level=[0, 1]).sum().unstack(fill_value=0).reindex(columns=range(len(columns)), fill_value=0)
+        deltas = pivot.to_numpy(dtype='int64')
+        labels = list(pivot.index.strftime('%Y-%m-%d %H:%M'))
+
+    # 시점 t 포함 이후에 일어난 변동 합계 = 역방향 누적합
+    since = deltas[::-1].cumsum(axis=0)[::-1]
+    # 되감으며 0 미만이 되면 0으로 보정한 값 (보정 이후 시점은 그 0부터 다시 되감김)
+    peak = np.maximum.accumulate(since[::-1], axis=0)[::-1] if len(since) else since
+    values = np.maximum(current, peak) - since
+
+    # 현재 시점 행 추가 (같은 분에 로그가 있으면 현재 재고가 우선)
+    keep = [label != now_label for label in labels]
+    levels = pd.DataFrame(
+        np.vstack([values[keep], current.reshape(1, -1)]),
+        index=[label for label, k in zip(labels, keep) if k] + [now_label],
+        columns=columns
+    )
+    return levels.sort_index()
+
+
+def blood_type_matrix(levels: pd.DataFrame, prep_ids, dtype: str = 'int64') -> np.ndarray:
+    """재고 수준 행렬에서 지정 제제를 혈액형별로 합산 → (시점 × BLOOD_TYPES) 배열"""
+    selected = levels.loc[:, levels.columns.get_level_values('prep_id').isin(prep_ids)]
+    by_type = selected.T.groupby(level='blood_type').sum().T
+    return by_type.reindex(index=levels.index, columns=BLOOD_TYPES, fill_value=0).to_numpy(dtype=dtype)
+
+
+def inbound_matrix(df_inbound: pd.DataFrame, prep_ids, days) -> np.ndarray:
+    """입고 내역을 (일자 × BLOOD_TYPES) 그리드로 합산 (입고 없는 날/혈액형은 0)"""
+    df = df_inbound[df_inbound['prep_id'].isin(prep_ids)]
+    grid = pd.pivot_table(df, index='date', columns='blood_type', values='qty', aggfunc='sum') \
+        if not df.empty else pd.DataFrame()
+    return grid.reindex(index=days, columns=BLOOD_TYPES).fillna(0).to_numpy(dtype='int64')
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets 다운샘플링 - 선택된 행 인덱스 (첫/마지막 점 포함)
+
+    y가 (점 × 시리즈) 행렬이면 시리즈별 삼각형 면적의 합으로 점을 골라 모든 시리즈가 같은 x축을 공유.
+    버킷 내 후보 면적은 numpy로 일괄 계산하고, 이전 선택점에 의존하는 버킷 간 순회만 파이썬 루프.
+    """
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+    y = y.reshape(n, -1).astype('float64')
+    x = x.astype('float64')
+
+    # 첫/마지막 점을 제외한 나머지를 (max_points - 2)개 버킷으로 균등 분할
+    edges = np.linspace(1, n - 1, max_points - 1).astype('int64')
+    # 다음 버킷 평균점 (마지막 버킷은 마지막 점)
+    csum_x = np.concatenate([[0.0], np.cumsum(x)])
+    csum_y = np.vstack([np.zeros((1, y.shape[1])), np.cumsum(y, axis=0)])
+    next_lo = np.append(edges[1:-1], n - 1)
+    next_hi = np.append(edges[2:], n)
+    widths = (next_hi - next_lo)[:, None]
+    avg_x = (csum_x[next_hi] - csum_x[next_lo]) / widths[:, 0]
+    avg_y = (csum_y[next_hi] - csum_y[next_lo]) / widths
+
+    selected = np.empty(max_points, dtype='int64')
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for b, (lo, hi) in enumerate(zip(edges[:-1], edges[1:])):
+        # 삼각형(a, 후보, 다음 버킷 평균) 면적 x2 = |(xa - xc)(yb - ya) - (xa - xb)(yc - ya)|
+        area = np.abs(
+            (x[a] - avg_x[b]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi, None]) * (avg_y[b] - y[a])
+        ).sum(axis=1)
+        a = lo + int(np.argmax(area))
+        selected[b + 1] = a
+    return selected
+
+
+def downsample_chart(chart: dict, max_points: int) -> dict:
+    """차트 응답의 모든 시리즈를 LTTB로 max_points개 이하 공통 시점으로 축소 (원본은 변경하지 않음)"""
+    dates = chart['dates']
+    if not max_points or len(dates) <= max_points:
+        return chart
+    series_keys = [key for key in ('series', 'ratio_series', 'min_series', 'max_series') if key in chart]
+    y = np.column_stack([chart['series'][bt] for bt in BLOOD_TYPES])
+    # x축은 실제 시각 (변경점 간격이 불균등하므로), 라벨 해석 실패 시 순번
+    try:
+        x = pd.to_datetime(pd.Index(dates)).asi8 / 6e10
+    except (ValueError, TypeError):
+        x = np.arange(len(dates))
+    keep = lttb_indices(np.asarray(x), y, max_points)
+
+    res = dict(chart, dates=[dates[i] for i in keep])
+    for key in series_keys:
+        res[key] = {bt: [values[i] for i in keep] for bt, values in chart[key].items()}
+    return res
+
+
+def split_preps(prep_map: dict):
+    """RBC 합산 대상(PRBC + Pre-R) / FFP 제제 ID 목록"""
+    rbc_preps = [k for k,v in prep_map.items() if v in ["PRBC", "Pre-R", "Prefiltered"]]
+    ffp_preps = [k for k,v in prep_map.items() if v == "FFP"]
+    return rbc_preps, ffp_preps
+
+
+def dcr_vector(rbc_dcr) -> np.ndarray:
+    """혈액형별 RBC DCR 합계 (BLOOD_TYPES 순) - 공통 설정은 모든 혈액형에 가산"""
+    dcr_map = {'A': 0.0, 'B': 0.0, 'O': 0.0, 'AB': 0.0}
+    for blood_type, daily_consumption_rate in rbc_dcr:
+        if daily_consumption_rate:
+            if blood_type in dcr_map:
+                 dcr_map[blood_type] += daily_consumption_rate
+            elif not blood_type:
+                # 공통 설정인 경우
+                for bt in dcr_map.keys():
+                    dcr_map[bt] += daily_consumption_rate
+    return np.array([dcr_map[bt] for bt in BLOOD_TYPES])
+
+
+def rbc_ratio_matrix(rbc_matrix: np.ndarray, dcr: np.ndarray) -> np.ndarray:
+    """RBC 재고비 (수량 / DCR) - 혈액형별 DCR 벡터로 브로드캐스팅"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(dcr > 0, np.round(rbc_matrix / dcr, 1), 0.0)
+
+
+def rbc_alerts(dates, rbc_matrix: np.ndarray, rbc_targets: np.ndarray) -> list:
+    """RBC 타겟 합산 벡터와 비교해 목표 미달 알람 목록 (최신 시점부터 혈액형 순)"""
+    alerts = []
+    reversed_rows, cols = np.nonzero(rbc_matrix[::-1] < rbc_targets)
+    for row, col in zip(len(dates) - 1 - reversed_rows, cols):
+        qty = rbc_matrix[row, col]
+        alerts.append({
+            'date': dates[row],
+            'blood_type': BLOOD_TYPES[col],
+            'component': 'RBC 합산',
+            'qty': int(qty) if float(qty).is_integer() else round(float(qty), 1),
+            'target': int(rbc_targets[col]),
+            'reason': '목표 재고량 미만'
+        })
+    return alerts
+
+
+def inbound_charts(inbounds, start, end, rbc_preps, ffp_preps, resolution: str = 'day'):
+    """
+    입고 통계 (InboundHistory) 차트 - RBC/FFP
+
+    입고 데이터 전용 날짜 목록 (재고 시점과 독립적)으로 집계. week/month 해상도는 해당 구간 단위로 합산.
+    """
+    df_inbound = pd.DataFrame(inbounds, columns=['date', 'blood_type', 'prep_id', 'qty'])
+    if resolution in ('week', 'month'):
+        if not df_inbound.empty:
+            df_inbound['date'] = bucket_floor(pd.DatetimeIndex(pd.to_datetime(df_inbound['date'])), resolution)
+        buckets = bucket_floor(pd.date_range(start, end, freq='D'), resolution).unique()
+        labels = list(buckets.strftime(BUCKET_LABEL_FORMAT[resolution]))
+    else:
+        buckets = pd.date_range(start, end, freq='D').date
+        labels = [d.strftime('%Y-%m-%d') for d in buckets]
+    return (
+        make_chart_data(labels, inbound_matrix(df_inbound, rbc_preps, buckets)),
+        make_chart_data(labels, inbound_matrix(df_inbound, ffp_preps, buckets)),
+    )
+
+
+def make_chart_data(dates, matrix: np.ndarray, ratio_matrix: np.ndarray = None) -> dict:
+    """(시점 × BLOOD_TYPES) 행렬 → 차트 응답 (RBC는 재고비 시리즈 포함)"""
+    res = {'dates': dates, 'series': {bt: matrix[:, i].tolist() for i, bt in enumerate(BLOOD_TYPES)}}
+    if ratio_matrix is not None:
+        res['ratio_series'] = {bt: ratio_matrix[:, i].tolist() for i, bt in enumerate(BLOOD_TYPES)}
+    return res
+
+
+def resolve_granularity(start_date: str, end_date: str, granularity: str = 'auto', now: datetime = None) -> str:
+    """
+    auto → 조회 기간 길이에 맞는 해상도 (짧은 기간은 변경점 단위 그대로)
+
+    hour 롤업은 ROLLUP_HOUR_RETENTION_DAYS 이내만 보관하므로, 시작일이 보관 범위 밖이면
+    일부 구간만 반환하지 않도록 day로 대체 (응답의 requested_granularity로 표시)
+    """
+    if granularity == 'auto':
+        days = (datetime.strptime(end_date, '%Y-%m-%d') - datetime.strptime(start_date, '%Y-%m-%d')).days + 1
+        granularity = next((g for max_days, g in AUTO_GRANULARITY_MAX_DAYS if days <= max_days), 'month')
+    if granularity == 'hour' and \
+            datetime.strptime(start_date, '%Y-%m-%d') < hour_retention_start(now or datetime.now()):
+        return 'day'
+    return granularity
+
+
+def with_requested_granularity(result: dict, requested: str) -> dict:
+    """명시한 해상도가 대체된 경우(hour → day) 요청 값을 응답에 함께 표시 (캐시 결과는 수정하지 않음)"""
+    if 'error' in result or requested in ('auto', result['granularity']):
+        return result
+    return dict(result, requested_granularity=requested)
+
+
+def load_analytics_inputs(db: Session, start_date: str, end_date: str, granularity: str = 'event') -> dict:
+    """
+    분석에 필요한 원천 데이터를 DB/기준정보 캐시에서 수집 (I/O 단계)
+
+    반환값은 순수 파이썬 값(dict/list/tuple)만 담으므로 프로세스 풀로 전달 가능.
+    granularity가 롤업 해상도(hour/day/week/month)면 StockLog 대신 저장된 inventory_rollup을 조회 (읽기 전용).
     """
     start = datetime.strptime(start_date, '%Y-%m-%d').date()
     end = datetime.strptime(end_date, '%Y-%m-%d').date()
+    now = datetime.now()
     
-    # 1. 모든 `BloodMaster` 
-    preps = db.query(BloodMaster).all()
-    prep_map = {p.id: p.preparation for p in preps}
-    
+    refs = reference_cache.get(db)
+    inputs = {
+        'granularity': granularity,
+        'start': start,
+        'end': end,
+        'now': now,
+        'prep_map': {p.id: p.preparation for p in refs.preps.values()},
+        'target_stocks': {key: sc.safety_qty for key, sc in refs.safety_configs.items()},
+        # RBC 관련 설정값 (daily_consumption_rate) - (blood_type, DCR)
+        'rbc_dcr': [(mc.blood_type, mc.daily_consumption_rate) for mc in refs.configs('rbc_factors')],
+        'inbounds': load_inbounds(db, start, end),
+    }
+
+    if granularity in RESOLUTIONS:
+        # 저장된 롤업의 기간 구간만 조회 (갱신은 쓰기 경로의 백그라운드 작업 → 조회는 읽기 전용)
+        range_start = bucket_floor(pd.DatetimeIndex([start]), granularity)[0].to_pydatetime()
+        range_end = datetime.combine(end + timedelta(days=1), datetime.min.time())
+        inputs['rollups'] = load_rollups(db, granularity, range_start, range_end)
+        return inputs
+
     # 2. 현재 재고 가져오기
-    current_inv = db.query(Inventory).all()
     current_stock = {} # (blood_type, prep_id): qty
-    for inv in current_inv:
-        current_stock[(inv.blood_type, inv.prep_id)] = inv.current_qty
-        
-    # 3. 현재 목표 재고 가져오기
-    safety_configs = db.query(SafetyConfig).all()
-    target_stocks = {}
-    for sc in safety_configs:
-        target_stocks[(sc.blood_type, sc.prep_id)] = sc.safety_qty
+    for bt, pid, qty in db.query(Inventory.blood_type, Inventory.prep_id, Inventory.current_qty).all():
+        current_stock[(bt, pid)] = qty
         
-    # 4. StockLog 전체 가져오기 및 역산
-    # 오늘 포함 미래의 데이터부터 과거로 역산해야 함.
-    # 안전하게 전체 StockLog를 들고 오되 쿼리를 가볍게... (메모리 로싱은 병원 데이터에선 크지 않음)
+    # 4. 조회 기간의 StockLog만 가져오기 (log_date 인덱스 범위 조회)
+    window_start = datetime.combine(start, datetime.min.time())
+    window_end = datetime.combine(end + timedelta(days=1), datetime.min.time())
     logs = db.query(
         StockLog.log_date,
         StockLog.blood_type,
         StockLog.prep_id,
         StockLog.in_qty,
         StockLog.out_qty
-    ).order_by(StockLog.log_date.desc()).all()
-    
-    df_logs = pd.DataFrame(logs)
-    
-    # 데일리 재고 저장소
-    daily_stock_history = []
-    
-    # 날짜 범위 (end_date부터 과거로 하루 단위)
-    # db.Inventory는 '오늘/현재'의 값이 반영된 상태.
-    # 만약 오늘 발생한 로그가 있다면, 어제 자정 기준 재고 = 현재 재고 - 오늘 델타
-    today = datetime.now().date()
-    current_iter_date = today
-    
-    # iter_stock: 각 스텝에서의 기준 재고 (처음엔 current)
-    iter_stock = current_stock.copy()
-    
+    ).filter(
+        StockLog.log_date >= window_start,
+        StockLog.log_date < window_end
+    ).all()
+
+    # 5. 종료일 마감 시점 재고 = 현재 재고에서 종료일 이후 로그를 되감은 값 (SQL 집계)
+    #    기간 내 역산과 같은 음수 보정: max(현재, 이후 변동 합계의 최대) - 종료일 이후 순변동
+    end_stock = dict(current_stock)
+    if window_end <= now:
+        delta = StockLog.in_qty - StockLog.out_qty
+        cell = (StockLog.blood_type, StockLog.prep_id)
+        suffix = db.query(
+            StockLog.blood_type,
+            StockLog.prep_id,
+            func.sum(delta).over(
+                partition_by=cell, order_by=(StockLog.log_date.desc(), StockLog.id.desc()), rows=(None, 0)
+            ).label('since'),
+            func.sum(delta).over(partition_by=cell).label('net')
+        ).filter(
+            StockLog.log_date >= window_end
+        ).subquery()
+        after_end = db.query(
+            suffix.c.blood_type, suffix.c.prep_id, func.max(suffix.c.since), func.max(suffix.c.net)
+        ).group_by(suffix.c.blood_type, suffix.c.prep_id).all()
+        for bt, pid, peak, net_delta in after_end:
+            qty = end_stock.get((bt, pid), 0)
+            end_stock[(bt, pid)] = max(qty, int(peak or 0)) - int(net_delta or 0)
+
+    inputs['end_stock'] = end_stock
+    inputs['logs'] = [tuple(row) for row in logs]
+    return inputs
+
+
+def load_inbounds(db: Session, start, end) -> list:
+    """입고 통계 (InboundHistory) - (date, blood_type, prep_id, qty)"""
+    inbounds = db.query(
+        InboundHistory.receive_date.label('date'),
+        InboundHistory.blood_type,
+        InboundHistory.prep_id,
+        InboundHistory.qty
+    ).filter(
+        InboundHistory.receive_date >= start,
+        InboundHistory.receive_date <= end
+    ).all()
+    return [tuple(row) for row in inbounds]
+
+
+def compute_analytics(inputs: dict) -> dict:
+    """
+    수집된 원천 데이터로 차트/통계 산출 (CPU 단계, DB 접근 없음 - 프로세스 풀에서 실행 가능)
+    """
+    if inputs.get('granularity') in RESOLUTIONS:
+        return compute_rollup_analytics(inputs)
+
+    start, end, prep_map = inputs['start'], inputs['end'], inputs['prep_map']
+    target_stocks = inputs['target_stocks']
+
+    df_logs = pd.DataFrame(inputs['logs'], columns=['log_date', 'blood_type', 'prep_id', 'in_qty', 'out_qty'])
     # 로그가 없는 경우 빈 데이터프레임 방어
     if df_logs.empty:
-        df_logs = pd.DataFrame(columns=['log_date', 'blood_type', 'prep_id', 'in_qty', 'out_qty'])
+        df_logs = pd.DataFrame(columns=['log_date', 'blood_type', 'prep_id', 'in_qty', 'out_qty', 'date', 'delta'])
     else:
-        df_logs['date'] = pd.to_datetime(df_logs['log_date']).dt.date
+        df_logs['log_date'] = pd.to_datetime(df_logs['log_date'])
+        df_logs['date'] = df_logs['log_date'].dt.date
         df_logs['delta'] = df_logs['in_qty'] - df_logs['out_qty']
 
-    # 기간 구하기
-    # start부터 end까지 (+ today ~ end) 역산
-    date_range = []
-    # 기간 구하기
-    # Today부터 start까지 역산 진행
-    # 1. 현재 시점 재고 추가
-    for (bt, pid), qty in iter_stock.items():
-        daily_stock_history.append({
-            'date': datetime.now().strftime('%Y-%m-%d %H:%M'),
-            'blood_type': bt,
-            'prep_id': pid,
-            'qty': qty
-        })
+    # 변경점(입력시점)별 재고 수준을 벡터 연산으로 역산 → (시점 × 혈액형/제제) 행렬
+    # (현재 시점 행은 종료일이 오늘 이후일 때만 기간 필터를 통과하며, 이때 end_stock == 현재 재고)
+    now_label = inputs['now'].strftime('%Y-%m-%d %H:%M')
+    levels = reconstruct_stock_levels(df_logs, inputs['end_stock'], now_label)
 
-    # 2. 로그를 역순으로 훑으며 각 변경점(입력시점)마다 스냅샷 저장
-    if not df_logs.empty:
-        for _, row in df_logs.iterrows():
-            log_date = row['date']
-            # 대상 기간 이전의 로그면 종료
-            if log_date < start:
-                break
-                
-            # 해당 로그 발생 이전의 재고로 역산
-            key = (row['blood_type'], row['prep_id'])
-            if key in iter_stock:
-                iter_stock[key] -= row['delta']
-                if iter_stock[key] < 0:
-                    iter_stock[key] = 0
-            
-            # 역산된 스냅샷(과거 시점 재고) 추가
-            for (bt, pid), qty in iter_stock.items():
-                daily_stock_history.append({
-                    'date': row['log_date'].strftime('%Y-%m-%d %H:%M'),
-                    'blood_type': bt,
-                    'prep_id': pid,
-                    'qty': qty
-                })
-
-    df_stock = pd.DataFrame(daily_stock_history)
-    # 기간 필터
-    df_stock['date_obj'] = pd.to_datetime(df_stock['date']).dt.date
-    df_period = df_stock[(df_stock['date_obj'] >= start) & (df_stock['date_obj'] <= end)]
-    
-    # 매핑 이름 조인
-    if not df_period.empty:
-        df_period['prep_name'] = df_period['prep_id'].map(prep_map)
-    else:
+    # 기간 필터 (시점 라벨 앞 10자리 = 'YYYY-MM-DD')
+    label_dates = levels.index.str[:10]
+    period = levels[(label_dates >= start.isoformat()) & (label_dates <= end.isoformat())]
+    if period.empty:
         return {"error": "데이터가 없습니다."} # UI를 위해 빈 통계라도 리턴해야함
 
     # -- 통계 및 차트 추출 --
+    dates = list(period.index)
+
+    # 1. RBC 합산 (PRBC + Pre-R) / 2. FFP → (시점 × 혈액형) 행렬
+    rbc_preps, ffp_preps = split_preps(prep_map)
+    rbc_matrix = blood_type_matrix(period, rbc_preps)
+    ffp_matrix = blood_type_matrix(period, ffp_preps)
     
-    # 1. RBC 합산 (PRBC + Pre-R)
-    rbc_preps = [k for k,v in prep_map.items() if v in ["PRBC", "Pre-R", "Prefiltered"]]
-    df_rbc = df_period[df_period['prep_id'].isin(rbc_preps)].groupby(['date', 'blood_type'])['qty'].sum().reset_index()
-    
-    # 2. FFP
-    ffp_preps = [k for k,v in prep_map.items() if v == "FFP"]
-    df_ffp = df_period[df_period['prep_id'].isin(ffp_preps)].groupby(['date', 'blood_type'])['qty'].sum().reset_index()
-    
-    dates = sorted(list(set(df_period['date'].tolist())))
-    
-    # RBC 관련 설정값 (daily_consumption_rate) 불러오기
-    master_configs = db.query(MasterConfig).all()
     # DCR 매핑: (blood_type) -> sum of DCR for RBC preps
-    dcr_map = {'A': 0.0, 'B': 0.0, 'O': 0.0, 'AB': 0.0}
-    for mc in master_configs:
-        if mc.config_key == 'rbc_factors' and mc.daily_consumption_rate:
-            if mc.blood_type in dcr_map:
-                 dcr_map[mc.blood_type] += mc.daily_consumption_rate
-            elif not mc.blood_type:
-                # 공통 설정인 경우
-                for bt in dcr_map.keys():
-                    dcr_map[bt] += mc.daily_consumption_rate
-
-    # 차트 데이터 생성 유틸 (비율도 함께 계산)
-    def make_chart_data(df_group, is_rbc=False):
-        series = {'A': [], 'B': [], 'O': [], 'AB': []}
-        ratio_series = {'A': [], 'B': [], 'O': [], 'AB': []} if is_rbc else None
-
-        for d in dates:
-            day_data = df_group[df_group['date'] == d]
-            for bt in ['A', 'B', 'O', 'AB']:
-                qty = day_data[day_data['blood_type'] == bt]['qty'].sum()
-                qty = int(qty)
-                series[bt].append(qty)
-                
-                # RBC인 경우 ratio 산출 (수량 / DCR)
-                if is_rbc:
-                    dcr = dcr_map.get(bt, 0.0)
-                    ratio = round(qty / dcr, 1) if dcr > 0 else 0.0
-                    ratio_series[bt].append(ratio)
-
-        res = {'dates': dates, 'series': series}
-        if is_rbc:
-            res['ratio_series'] = ratio_series
-        return res
-
-    chart_rbc = make_chart_data(df_rbc, is_rbc=True)
-    chart_ffp = make_chart_data(df_ffp)
+    rbc_ratio = rbc_ratio_matrix(rbc_matrix, dcr_vector(inputs['rbc_dcr']))
+
+    chart_rbc = make_chart_data(dates, rbc_matrix, rbc_ratio)
+    chart_ffp = make_chart_data(dates, ffp_matrix)
     
     # -- 3. 목표 미달 알람(Alert) 히스토리 추출 (해당 기간) --
-    alerts = []
-    # RBC의 타겟을 조회하여 daily RBC와 비교
-    for d in dates:
-        day_rbc = df_rbc[df_rbc['date'] == d]
-        for bt in ['A', 'B', 'O', 'AB']:
-            # RBC 타겟 합산 (PRBC + Pre-R)
-            target = 0
-            for pid in rbc_preps:
-                target += target_stocks.get((bt, pid), 0)
-                
-            qty = day_rbc[day_rbc['blood_type'] == bt]['qty'].sum() if not day_rbc.empty else 0
-            if qty < target:
-                alerts.append({
-                    'date': d,
-                    'blood_type': bt,
-                    'component': 'RBC 합산',
-                    'qty': int(qty),
-                    'target': int(target),
-                    'reason': '목표 재고량 미만'
-                })
-                
+    # RBC 타겟 합산 (PRBC + Pre-R) 벡터와 비교
+    rbc_targets = np.array([sum(target_stocks.get((bt, pid), 0) for pid in rbc_preps) for bt in BLOOD_TYPES])
+    alerts = rbc_alerts(dates, rbc_matrix, rbc_targets)
     # FFP 타겟 비교
     # FFP도 알람 띄우면 좋지만 유저가 "PRBC"만 명시했음. 일단 RBC만.
-    alerts = sorted(alerts, key=lambda x: x['date'], reverse=True)
     
     # -- 요약 카드 (해당 기간내) --
     total_in = 0
@@ -197,55 +391,17 @@ def get_analytics_data(db: Session, start_date: str, end_date: str):
         total_in = int(df_logs_period['in_qty'].sum())
         total_out = int(df_logs_period['out_qty'].sum())
         
-    avg_rbc = float(df_rbc['qty'].sum() / len(dates)) if len(dates) > 0 and not df_rbc.empty else 0
-    min_rbc = int(df_rbc.groupby('date')['qty'].sum().min()) if not df_rbc.empty else 0
+    rbc_totals = rbc_matrix.sum(axis=1)
+    avg_rbc = float(rbc_totals.sum() / len(dates))
+    min_rbc = int(rbc_totals.min())
     
     # -- 4. 입고 통계 (InboundHistory) 추출 --
-    inbounds = db.query(
-        InboundHistory.receive_date.label('date'),
-        InboundHistory.blood_type,
-        InboundHistory.prep_id,
-        InboundHistory.qty
-    ).filter(
-        InboundHistory.receive_date >= start,
-        InboundHistory.receive_date <= end
-    ).all()
-    
-    df_inbound = pd.DataFrame(inbounds)
-    if not df_inbound.empty:
-        df_inbound['date'] = df_inbound['date'].apply(lambda x: x.strftime('%Y-%m-%d'))
-    else:
-        df_inbound = pd.DataFrame(columns=['date', 'blood_type', 'prep_id', 'qty'])
-
-    # 입고 데이터 전용 날짜 목록 생성 (StockLog dates와 독립적)
-    d_iter = start
-    inbound_dates = []
-    while d_iter <= end:
-        inbound_dates.append(d_iter.strftime('%Y-%m-%d'))
-        d_iter += timedelta(days=1)
-
-    def make_inbound_chart_data(df_group):
-        """입고 전용 차트 데이터: inbound_dates 기준으로 시리즈 생성"""
-        series = {'A': [], 'B': [], 'O': [], 'AB': []}
-        for d in inbound_dates:
-            day_data = df_group[df_group['date'] == d] if not df_group.empty else pd.DataFrame()
-            for bt in ['A', 'B', 'O', 'AB']:
-                qty = int(day_data[day_data['blood_type'] == bt]['qty'].sum()) if not day_data.empty else 0
-                series[bt].append(qty)
-        return {'dates': inbound_dates, 'series': series}
-
-    df_inbound_rbc = df_inbound[df_inbound['prep_id'].isin(rbc_preps)]
-    if not df_inbound_rbc.empty:
-        df_inbound_rbc = df_inbound_rbc.groupby(['date', 'blood_type'])['qty'].sum().reset_index()
-        
-    df_inbound_ffp = df_inbound[df_inbound['prep_id'].isin(ffp_preps)]
-    if not df_inbound_ffp.empty:
-        df_inbound_ffp = df_inbound_ffp.groupby(['date', 'blood_type'])['qty'].sum().reset_index()
-
-    chart_inbound_rbc = make_inbound_chart_data(df_inbound_rbc)
-    chart_inbound_ffp = make_inbound_chart_data(df_inbound_ffp)
+    chart_inbound_rbc, chart_inbound_ffp = inbound_charts(inputs['inbounds'], start, end, rbc_preps, ffp_preps)
 
     return {
+        "granularity": "event",
+        "effective_start": start.isoformat(),
+        "effective_end": end.isoformat(),
         "summary": {
             "total_in": total_in,
             "total_out": total_out,
@@ -258,3 +414,130 @@ def get_analytics_data(db: Session, start_date: str, end_date: str):
         "chart_inbound_ffp": chart_inbound_ffp,
         "alerts": alerts
     }
+
+
+def compute_rollup_analytics(inputs: dict) -> dict:
+    """
+    inventory_rollup(시간/일/주/월) 기반 차트/통계 산출
+
+    - 재고 시리즈는 구간 시간가중 평균, min_series/max_series는 셀별 최소/최대의 혈액형 합
+      (셀마다 최소 시점이 다를 수 있으므로 실제 합계 최소보다 작거나 같음)
+    - 목표 미달 알람은 구간 평균 기준
+    """
+    resolution, start, end = inputs['granularity'], inputs['start'], inputs['end']
+    rbc_preps, ffp_preps = split_preps(inputs['prep_map'])
+
+    df = pd.DataFrame(inputs.get('rollups', []), columns=ROLLUP_COLUMNS)
+    if df.empty:
+        return {"error": "데이터가 없습니다."}
+    df['bucket_start'] = pd.to_datetime(df['bucket_start'])
+
+    # 구간 × 셀 행렬 (평균/최소/최대)
+    grids = {
+        name: df.pivot_table(index='bucket_start', columns=STOCK_KEY_NAMES, values=name, aggfunc='sum')
+        for name in ('avg_qty', 'min_qty', 'max_qty')
+    }
+    dates = list(grids['avg_qty'].index.strftime(BUCKET_LABEL_FORMAT[resolution]))
+
+    def charts(prep_ids, ratio_dcr=None):
+        avg = np.round(blood_type_matrix(grids['avg_qty'], prep_ids, dtype='float64'), 1)
+        chart = make_chart_data(dates, avg, rbc_ratio_matrix(avg, ratio_dcr) if ratio_dcr is not None else None)
+        chart['min_series'] = make_chart_data(dates, blood_type_matrix(grids['min_qty'], prep_ids))['series']
+        chart['max_series'] = make_chart_data(dates, blood_type_matrix(grids['max_qty'], prep_ids))['series']
+        return chart, avg
+
+    chart_rbc, rbc_avg = charts(rbc_preps, dcr_vector(inputs['rbc_dcr']))
+    chart_ffp, _ = charts(ffp_preps)
+
+    target_stocks = inputs['target_stocks']
+    rbc_targets = np.array([sum(target_stocks.get((bt, pid), 0) for pid in rbc_preps) for bt in BLOOD_TYPES])
+    alerts = rbc_alerts(dates, rbc_avg, rbc_targets)
+
+    chart_inbound_rbc, chart_inbound_ffp = inbound_charts(
+        inputs['inbounds'], start, end, rbc_preps, ffp_preps, resolution
+    )
+
+    # 기간 밖 일부를 포함하는 첫 구간(주/월)도 입출고 합계에 포함됨
+    rbc_min = blood_type_matrix(grids['min_qty'], rbc_preps).sum(axis=1)
+    return {
+        "granularity": resolution,
+        # 첫 구간(주/월)은 시작일 이전 일자부터 집계됨
+        "effective_start": bucket_floor(pd.DatetimeIndex([start]), resolution)[0].date().isoformat(),
+        "effective_end": end.isoformat(),
+        "summary": {
+            "total_in": int(df['in_qty'].sum()),
+            "total_out": int(df['out_qty'].sum()),
+            "avg_rbc": round(float(rbc_avg.sum(axis=1).mean()), 1),
+            "min_rbc": int(rbc_min.min())
+        },
+        "chart_rbc": chart_rbc,
+        "chart_ffp": chart_ffp,
+        "chart_inbound_rbc": chart_inbound_rbc,
+        "chart_inbound_ffp": chart_inbound_ffp,
+        "alerts": alerts
+    }
+
+
+def downsample_result(result: dict, max_points: int = None) -> dict:
+    """분석 결과의 재고 추이 차트(chart_rbc/chart_ffp)를 max_points 이하로 축소"""
+    if not max_points or 'error' in result:
+        return result
+    return dict(
+        result,
+        chart_rbc=downsample_chart(result['chart_rbc'], max_points),
+        chart_ffp=downsample_chart(result['chart_ffp'], max_points),
+    )
+
+
+def get_analytics_data(db: Session, start_date: str, end_date: str, granularity: str = 'auto',
+                       max_points: int = None):
+    """
+    지정된 기간 동안의 분석 데이터를 생성합니다.
+    - RBC 추이 (PRBC + Pre-R 합산)
+    - FFP 추이
+    - 요약 카드 데이터 (기간 내 입고량, 최소 재고, 평균 재고)
+    - 목표 미달 경고 내역
+
+    granularity: auto(기간 길이로 선택) / event(변경점 단위) / hour / day / week / month (롤업)
+                 (hour는 시작일이 보관 범위 밖이면 day로 대체)
+    max_points: 지정 시 재고 추이 차트를 LTTB로 다운샘플링
+
+    응답의 granularity/effective_start/effective_end는 실제 적용된 해상도와 집계 범위.
+    """
+    requested = granularity
+    granularity = resolve_granularity(start_date, end_date, granularity)
+    result = compute_analytics(load_analytics_inputs(db, start_date, end_date, granularity))
+    return with_requested_granularity(downsample_result(result, max_points), requested)
+
+
+def get_cached_analytics_data(db: Session, start_date: str, end_date: str, granularity: str = 'auto',
+                              max_points: int = None):
+    """
+    get_analytics_data + LRU 결과 캐시
+
+    (기간, 데이터 워터마크 - analytics_cache.data_watermark)가 같으면 이전 결과를 그대로 반환.
+    워터마크 확인에 가벼운 조회 1회만 사용.
+    event 해상도에서 종료일이 오늘 이후면 차트 마지막 점이 현재 시각이므로 키에 현재 분을 포함.
+    캐시 미스가 동시에 몰리면(교대 시간 등) 같은 키의 계산은 한 번만 수행하고 나머지는
+    커넥션을 풀에 반납한 채 그 결과를 기다려 공유한다 (single-flight).
+    """
+    requested = granularity
+    now = datetime.now()
+    granularity = resolve_granularity(start_date, end_date, granularity, now)
+    now_label = now.strftime('%Y-%m-%d %H:%M') \
+        if granularity == 'event' and end_date >= now.strftime('%Y-%m-%d') else None
+    key = (start_date, end_date, granularity, now_label, *data_watermark(db))
+    result = analytics_results.get(key)
+    if result is not None:
+        return with_requested_granularity(downsample_result(result, max_points), requested)
+
+    def compute():
+        # DB 조회는 요청 스레드, pandas 계산은 CPU 프로세스 풀
+        inputs = load_analytics_inputs(db, start_date, end_date, granularity)
+        computed = cpu_pool.run_sync(compute_analytics, inputs)
+        analytics_results.put(key, computed)
+        return computed
+
+    # 캐시에는 전체 해상도 결과를 두고 다운샘플링은 요청별로 적용 (max_points가 달라도 캐시 공유)
+    result = analytics_flights.do(key, compute, before_wait=db.rollback)
+    return with_requested_granularity(downsample_result(result, max_points), requested)
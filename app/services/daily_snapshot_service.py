@@ -0,0 +1,229 @@
+"""
+일자별 마감 재고 스냅샷 (inventory_daily_snapshot) 관리
+
+- 재고 변동이 있는 날에만 (일자, 혈액형, 제제) 행을 둔다 → 변동 없는 날은 직전 행의 수량이 유지
+- 재고 저장 경로(update_inventory_and_log, bulk-save)가 같은 트랜잭션에서 당일 행을 upsert (증분 갱신)
+- 기존 이력은 backfill_daily_snapshots()로 StockLog + 현재 재고에서 역산해 일괄 생성
+  (테이블이 비어 있으면 기동 시 ensure_daily_snapshots()가 자동 실행 → 수동 백필 불필요)
+- 분석 조회는 기간 범위 + 기간 직전 마지막 행만 읽어 일자 그리드로 전개
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, func, insert, select, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.database.models import Inventory, InventoryDailySnapshot, StockLog
+
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = ['blood_type', 'prep_id', 'snapshot_date']
+
+
+def snapshot_upsert_statement(rows_select=None):
+    """
+    PostgreSQL 당일 스냅샷 upsert 문 (INSERT ... ON CONFLICT DO UPDATE)
+
+    Args:
+        rows_select: 지정 시 INSERT ... SELECT (snapshot_date, blood_type, prep_id, qty, updated_at)
+    """
+    stmt = pg_insert(InventoryDailySnapshot)
+    if rows_select is not None:
+        stmt = stmt.from_select(['snapshot_date', 'blood_type', 'prep_id', 'qty', 'updated_at'], rows_select)
+    return stmt.on_conflict_do_update(
+        index_elements=SNAPSHOT_KEY,
+        set_={'qty': stmt.excluded.qty, 'updated_at': stmt.excluded.updated_at}
+    )
+
+
+def record_daily_levels(db: Session, levels: Iterable[Tuple[str, int, int]], now: datetime) -> None:
+    """
+    재고 변경 후 수량을 당일 마감 스냅샷에 반영 (커밋은 호출자 트랜잭션에서)
+
+    Args:
+        levels: (blood_type, prep_id, 변경 후 수량) 목록
+    """
+    day = now.date()
+    rows = [
+        {'snapshot_date': day, 'blood_type': bt, 'prep_id': pid, 'qty': qty, 'updated_at': now}
+        for bt, pid, qty in levels
+    ]
+    if not rows:
+        return
+
+    if db.get_bind().dialect.name == 'postgresql':
+        db.execute(snapshot_upsert_statement(), rows)
+        return
+
+    # 그 외 DB: 당일 기존 행 조회 후 UPDATE / INSERT 분기
+    existing = {
+        (bt, pid): snap_id for snap_id, bt, pid in db.query(
+            InventoryDailySnapshot.id, InventoryDailySnapshot.blood_type, InventoryDailySnapshot.prep_id
+        ).filter(InventoryDailySnapshot.snapshot_date == day).all()
+    }
+    new_rows = []
+    for row in rows:
+        snap_id = existing.get((row['blood_type'], row['prep_id']))
+        if snap_id is None:
+            new_rows.append(row)
+        else:
+            db.query(InventoryDailySnapshot).filter(InventoryDailySnapshot.id == snap_id).update(
+                {'qty': row['qty'], 'updated_at': now}, synchronize_session=False
+            )
+    if new_rows:
+        db.execute(insert(InventoryDailySnapshot), new_rows)
+
+
+def backfill_daily_snapshots(db: Session) -> int:
+    """
+    StockLog 전체 이력과 현재 재고로 일자별 마감 재고를 역산해 스냅샷 테이블을 재생성
+
+    - 일자 d 마감 재고 = 현재 재고에서 d 마지막 로그 이후 로그를 되감은 값
+    - 첫 로그 전날에 모든 재고 셀의 기초 재고 행을 함께 기록 (변동 없는 셀 포함)
+    - 되감는 중 음수는 0으로 보정 (분석 역산 reconstruct_stock_levels와 동일한 누적 방식)
+
+    Returns:
+        생성된 스냅샷 행 수
+    """
+    current = {
+        (bt, pid): qty for bt, pid, qty in db.query(
+            Inventory.blood_type, Inventory.prep_id, Inventory.current_qty
+        ).all()
+    }
+    logs = pd.DataFrame(
+        db.query(
+            StockLog.log_date, StockLog.blood_type, StockLog.prep_id,
+            (StockLog.in_qty - StockLog.out_qty).label('delta')
+        ).order_by(StockLog.log_date, StockLog.id).all(),
+        columns=['log_date', 'blood_type', 'prep_id', 'delta']
+    )
+    now = datetime.now()
+
+    rows = []
+    if not logs.empty:
+        logs = logs[[key in current for key in zip(logs['blood_type'], logs['prep_id'])]]
+
+    if logs.empty:
+        opening_day = now.date()
+    else:
+        logs = logs.assign(
+            day=pd.to_datetime(logs['log_date']).dt.date,
+            delta=logs['delta'].astype('int64'),
+            current=[current[key] for key in zip(logs['blood_type'], logs['prep_id'])]
+        )
+        cells = logs.groupby(['blood_type', 'prep_id'], sort=False)
+        # 로그 직후 재고 = max(현재, 이후 변동 누적합의 최대) - 이후 변동 합계 (되감으며 0 미만이면 0과 동일)
+        since = logs.iloc[::-1].groupby(['blood_type', 'prep_id'], sort=False)['delta'].cumsum().iloc[::-1]
+        after = since - logs['delta']
+        peak = after.iloc[::-1].groupby([logs['blood_type'], logs['prep_id']], sort=False).cummax().iloc[::-1]
+        logs['qty'] = np.maximum(logs['current'], peak) - after
+        # 일자 마감 = 그날 마지막 로그 직후 재고
+        daily = logs.drop_duplicates(['blood_type', 'prep_id', 'day'], keep='last')
+        rows = [
+            {'snapshot_date': d, 'blood_type': bt, 'prep_id': int(pid), 'qty': int(qty), 'updated_at': now}
+            for d, bt, pid, qty in daily[['day', 'blood_type', 'prep_id', 'qty']].itertuples(index=False)
+        ]
+        opening_day = logs['day'].min() - timedelta(days=1)
+        # 기초 재고 = 첫 로그 직후 재고에서 첫 로그까지 되감은 값
+        first = cells.head(1)
+        first_since = since.loc[first.index]
+        opening = np.maximum(np.maximum(first['current'], peak.loc[first.index]), first_since) - first_since
+        opening = {
+            (bt, pid): int(qty) for bt, pid, qty in zip(first['blood_type'], first['prep_id'], opening)
+        }
+        current = {key: opening.get(key, qty) for key, qty in current.items()}
+
+    rows.extend(
+        {'snapshot_date': opening_day, 'blood_type': bt, 'prep_id': pid, 'qty': qty, 'updated_at': now}
+        for (bt, pid), qty in current.items()
+    )
+
+    db.execute(delete(InventoryDailySnapshot))
+    if rows:
+        db.execute(insert(InventoryDailySnapshot), rows)
+    db.commit()
+    logger.info(f"inventory_daily_snapshot 백필 완료: {len(rows)}행")
+    return len(rows)
+
+
+def ensure_daily_snapshots(db: Session) -> int:
+    """
+    스냅샷 테이블이 비어 있고 재고/이력이 있으면 백필 (기동 시 lifespan에서 호출)
+
+    비어 있는 테이블로 조회하면 모든 일자가 0으로 채워지므로, 배포 직후 첫 조회 전에 채워 둔다.
+
+    Returns:
+        생성된 스냅샷 행 수 (이미 있거나 데이터가 없으면 0)
+    """
+    if db.query(InventoryDailySnapshot.id).first() is not None:
+        return 0
+    if db.query(Inventory.id).first() is None and db.query(StockLog.id).first() is None:
+        return 0
+    return backfill_daily_snapshots(db)
+
+
+def get_daily_levels(db: Session, start: date, end: date,
+                     blood_types: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    기간 내 일자별 마감 재고 행렬
+
+    기간 내 스냅샷 행과 셀별 기간 직전 마지막 행을 한 번에 조회한 뒤 일자 그리드로 전개(직전 값 유지).
+    첫 스냅샷 이전 일자의 셀은 0. blood_types 지정 시 해당 혈액형만 조회 (SQL 필터).
+
+    Returns:
+        index=일자(start~end 전체), columns=MultiIndex(blood_type, prep_id)
+    """
+    snap = InventoryDailySnapshot
+    type_filter = [snap.blood_type.in_(blood_types)] if blood_types else []
+    prior = select(
+        snap.blood_type, snap.prep_id, func.max(snap.snapshot_date).label('snapshot_date')
+    ).where(snap.snapshot_date < start, *type_filter).group_by(snap.blood_type, snap.prep_id).subquery()
+    in_range = select(snap.snapshot_date, snap.blood_type, snap.prep_id, snap.qty).where(
+        snap.snapshot_date >= start, snap.snapshot_date <= end, *type_filter
+    )
+    before = select(snap.snapshot_date, snap.blood_type, snap.prep_id, snap.qty).join(
+        prior,
+        (snap.blood_type == prior.c.blood_type)
+        & (snap.prep_id == prior.c.prep_id)
+        & (snap.snapshot_date == prior.c.snapshot_date)
+    )
+    df = pd.DataFrame(
+        db.execute(union_all(in_range, before)).all(),
+        columns=['snapshot_date', 'blood_type', 'prep_id', 'qty']
+    )
+
+    days = pd.Index(pd.date_range(start, end, freq='D').date, name='date')
+    if df.empty:
+        return pd.DataFrame(index=days, columns=pd.MultiIndex.from_tuples([], names=['blood_type', 'prep_id']), dtype='int64')
+
+    df['snapshot_date'] = pd.to_datetime(df['snapshot_date']).dt.date
+    # 기간 직전 행은 start 일자 값으로 당겨와 ffill 시작점으로 사용 (start 당일 행이 있으면 그 값이 우선)
+    df['prior'] = df['snapshot_date'] < start
+    df.loc[df['prior'], 'snapshot_date'] = start
+    df = df.sort_values(['snapshot_date', 'prior'], ascending=[True, False]) \
+        .drop_duplicates(['snapshot_date', 'blood_type', 'prep_id'], keep='last')
+    levels = df.pivot(index='snapshot_date', columns=['blood_type', 'prep_id'], values='qty')
+    levels = levels.reindex(days).ffill().fillna(0).astype('int64')
+    levels.columns = levels.columns.set_names(['blood_type', 'prep_id'])
+    return levels.sort_index(axis=1)
+
+
+def daily_levels_to_dict(levels: pd.DataFrame, prep_map: Dict[int, str]) -> Dict:
+    """일자별 재고 행렬 → API 응답 형태"""
+    return {
+        'dates': [d.strftime('%Y-%m-%d') for d in levels.index],
+        'levels': [
+            {
+                'blood_type': bt,
+                'prep_id': int(pid),
+                'prep_name': prep_map.get(int(pid), ''),
+                'qty': levels[(bt, pid)].astype(int).tolist()
+            }
+            for bt, pid in levels.columns
+        ]
+    }
@@ -1,21 +1,55 @@
 import pandas as pd
+import numpy as np
+import hashlib
 import io
 import math
-from typing import List, Dict, Any
+import os
+import re
+import tempfile
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
-def parse_excel_inventory(file_bytes: bytes) -> Dict[str, Any]:
-    """
-    Excel 파일 바이트를 읽어서 혈액형/제제명별 수량을 집계합니다.
-    매핑되지 않은 혈액명 목록도 함께 반환하여 UI에서 연결할 수 있도록 지원합니다.
-    """
-    try:
-        df = pd.read_excel(io.BytesIO(file_bytes))
-    except Exception as e:
-        raise ValueError("엑셀 파일을 읽을 수 없습니다. 올바른 파일인지 확인해주세요.")
-    
-    # 필수 컬럼 검사 (최소한 혈액형과 제제명/혈액명과 유사한 단어가 있는지 찾기)
-    cols = list(df.columns)
+from openpyxl import load_workbook
+
+from app.core.config import settings
+
+# 사전 정의된 매핑 딕셔너리 (제제명은 정의 순서가 우선순위)
+PREP_MAPPING = {
+    "농축적혈구": "PRBC",
+    "PRBC": "PRBC",
+    "백혈구여과제거적혈구": "Pre-R",
+    "백혈구여과제거적혈구(Pre-storage)": "Pre-R",
+    "PRE-R": "Pre-R",
+    "농축혈소판": "PC",
+    "PC": "PC",
+    "성분채집혈소판": "SDP",
+    "SDP": "SDP",
+    "신선동결혈장": "FFP",
+    "FFP": "FFP",
+    "동결침전제제": "Cryo",
+    "CRYO": "Cryo"
+}
+
+BT_MAPPING = {
+    "A+": "A", "A-": "A", "A": "A",
+    "B+": "B", "B-": "B", "B": "B",
+    "O+": "O", "O-": "O", "O": "O",
+    "AB+": "AB", "AB-": "AB", "AB": "AB"
+}
+# 정확히 일치하지 않는 혈액형은 포함 여부로 추출 (AB 우선)
+BT_FALLBACK_ORDER = ["AB", "A", "B", "O"]
+
+# 제제명 키 전체를 한 번에 검사하는 정규식 - 키별 lookahead를 정의 순서대로 나열해
+# 문자열 내 위치와 무관하게 "먼저 정의된 키"가 매칭되도록 함 (그룹 i → PREP_MAPPING i번째 키)
+PREP_PATTERN = re.compile(
+    "^(?:" + "|".join(f"(?=.*?({re.escape(k.upper())}))" for k in PREP_MAPPING) + ")",
+    re.DOTALL
+)
+PREP_VALUES = np.array(list(PREP_MAPPING.values()) + [None], dtype=object)
+
+
+def find_columns(cols: List) -> Tuple[Any, Any, Any]:
+    """헤더에서 (혈액형, 혈액명/제제명, 공급일) 컬럼 찾기 - 공급일이 없으면 2번째 컬럼"""
     bt_col = next((c for c in cols if "혈액형" in str(c)), None)
     prep_col = next((c for c in cols if "혈액명" in str(c) or "제제명" in str(c) or "성분" in str(c)), None)
     
@@ -26,103 +60,189 @@ def parse_excel_inventory(file_bytes: bytes) -> Dict[str, Any]:
 
     if not bt_col or not prep_col:
         raise ValueError(f"'혈액형' 및 '혈액명'(또는 제제명) 컬럼이 엑셀에 존재해야 합니다. 현재 컬럼: {cols}")
-    
-    # 대표 날짜 추출 (첫 행 기준)
-    record_date = datetime.now().date()
-    if date_col and not df.empty:
-        try:
-            val = df.iloc[0][date_col]
-            if isinstance(val, (pd.Timestamp, datetime)):
-                record_date = val.date()
-            else:
-                # 문자열 등인 경우 파싱 시도
-                record_date = pd.to_datetime(val).date()
-        except:
-            pass
-    
-    # 사전 정의된 매핑 딕셔너리
-    PREP_MAPPING = {
-        "농축적혈구": "PRBC",
-        "PRBC": "PRBC",
-        "백혈구여과제거적혈구": "Pre-R",
-        "백혈구여과제거적혈구(Pre-storage)": "Pre-R",
-        "PRE-R": "Pre-R",
-        "농축혈소판": "PC",
-        "PC": "PC",
-        "성분채집혈소판": "SDP",
-        "SDP": "SDP",
-        "신선동결혈장": "FFP",
-        "FFP": "FFP",
-        "동결침전제제": "Cryo",
-        "CRYO": "Cryo"
-    }
-    
-    BT_MAPPING = {
-        "A+": "A", "A-": "A", "A": "A",
-        "B+": "B", "B-": "B", "B": "B",
-        "O+": "O", "O-": "O", "O": "O",
-        "AB+": "AB", "AB-": "AB", "AB": "AB"
-    }
+    return bt_col, prep_col, date_col
 
-    tally = {}
-    unmapped_preps = set()
-    mapped_rows = []
-
-    for index, row in df.iterrows():
-        raw_bt = str(row[bt_col]).strip()
-        raw_prep = str(row[prep_col]).strip()
-        
-        # 값이 없는 행 무시
-        if pd.isna(row[bt_col]) or pd.isna(row[prep_col]) or raw_bt == "nan" or raw_prep == "nan":
-            continue
-            
-        # 혈액형 매핑 (A+, B 등에서 + 제거 등)
-        bt_norm = raw_bt.upper()
-        if bt_norm in BT_MAPPING:
-            bt = BT_MAPPING[bt_norm]
-        else:
-            # 기본적으로 A, B, O, AB만 추출
-            bt = next((b for b in ["AB", "A", "B", "O"] if b in bt_norm), None)
-            if not bt:
-                continue # 알 수 없는 혈액형 스킵
-
-        # 제제명 매핑
-        prep_norm = raw_prep.upper()
-        # 정확한 일치나 부분 치환
-        prep = None
-        for k, v in PREP_MAPPING.items():
-            if k.upper() in prep_norm:
-                prep = v
-                break
-        
-        if not prep:
-            unmapped_preps.add(raw_prep)
-            prep = raw_prep # 그대로 넣고 이따가 unmapped로 처리
-            
-        key = (bt, prep)
-        tally[key] = tally.get(key, 0) + 1
-
-        mapped_rows.append({
-            "original_bt": raw_bt,
-            "original_prep": raw_prep,
-            "mapped_bt": bt,
-            "mapped_prep": prep
-        })
 
-    # 집계 결과를 리스트 포맷으로
+def parse_record_date(val) -> Optional[datetime]:
+    """공급일 셀 값 → date (빈 셀/파싱 실패 시 None)"""
+    if val is None or val is pd.NaT or (isinstance(val, float) and math.isnan(val)):
+        return None
+    try:
+        if isinstance(val, (pd.Timestamp, datetime)):
+            return val.date()
+        # 문자열 등인 경우 파싱 시도
+        return pd.to_datetime(val).date()
+    except:
+        return None
+
+
+def map_inventory_rows(bt_values: pd.Series, prep_values: pd.Series) -> Tuple[pd.Series, set, int]:
+    """
+    혈액형/혈액명 컬럼을 표준 혈액형/제제명으로 매핑해 집계
+
+    Returns:
+        ((혈액형, 제제명) → 건수 Series (첫 등장 순), 매핑 안 된 혈액명 set, 처리 행 수)
+    """
+    # 값이 없는 행 무시 (빈 셀 / 'nan' 문자열)
+    present = bt_values.notna() & prep_values.notna()
+    raw_bt = bt_values[present].astype(str).str.strip()
+    raw_prep = prep_values[present].astype(str).str.strip()
+    valid = (raw_bt != "nan") & (raw_prep != "nan")
+    raw_bt, raw_prep = raw_bt[valid], raw_prep[valid]
+
+    # 혈액형 매핑 (A+, B 등에서 + 제거 등) - 정확 일치 lookup 후 포함 여부 fallback
+    bt_norm = raw_bt.str.upper()
+    bt = bt_norm.map(BT_MAPPING)
+    fallback = np.select(
+        [bt_norm.str.contains(b, regex=False).to_numpy(dtype=bool) for b in BT_FALLBACK_ORDER],
+        BT_FALLBACK_ORDER, default=None
+    )
+    bt = bt.where(bt.notna(), pd.Series(fallback, index=bt.index, dtype=object))
+    known = bt.notna() # 알 수 없는 혈액형 스킵
+    bt, raw_prep = bt[known], raw_prep[known]
+
+    # 제제명 매핑 - 고유 제제명에만 정규식 적용 후 코드로 전개
+    codes, uniques = pd.factorize(raw_prep.str.upper())
+    matched = pd.Series(uniques, dtype=object).str.extract(PREP_PATTERN).notna().to_numpy()
+    first_group = np.where(matched.any(axis=1), matched.argmax(axis=1), len(PREP_MAPPING))
+    prep = pd.Series(PREP_VALUES[first_group][codes], index=raw_prep.index, dtype=object)
+
+    # 매핑 안 된 제제명은 원래 이름 그대로 넣고 unmapped로 처리
+    is_unmapped = prep.isna()
+    unmapped_preps = set(raw_prep[is_unmapped])
+    prep = prep.where(~is_unmapped, raw_prep)
+
+    tally = pd.DataFrame({"blood_type": bt, "preparation": prep}).value_counts(sort=False)
+    return tally, unmapped_preps, int(known.sum())
+
+
+def build_inventory_result(tally: Dict[Tuple[str, str], int], unmapped_preps: set,
+                           rows_processed: int, record_date) -> Dict[str, Any]:
+    """집계 결과를 리스트 포맷으로 (첫 등장 순)"""
     items = []
     for (bt, prep), qty in tally.items():
-        is_mapped = prep not in unmapped_preps
         items.append({
             "blood_type": bt,
             "preparation": prep,
-            "qty": qty,
-            "is_mapped": is_mapped
+            "qty": int(qty),
+            "is_mapped": prep not in unmapped_preps
         })
 
     return {
         "items": items,
         "unmapped": list(unmapped_preps),
-        "total_rows_processed": len(mapped_rows),
+        "total_rows_processed": rows_processed,
         "record_date": record_date.strftime("%Y-%m-%d")
     }
+
+
+def parse_excel_inventory(file_bytes: bytes) -> Dict[str, Any]:
+    """
+    Excel 파일 바이트를 읽어서 혈액형/제제명별 수량을 집계합니다.
+    매핑되지 않은 혈액명 목록도 함께 반환하여 UI에서 연결할 수 있도록 지원합니다.
+    """
+    try:
+        df = pd.read_excel(io.BytesIO(file_bytes))
+    except Exception as e:
+        raise ValueError("엑셀 파일을 읽을 수 없습니다. 올바른 파일인지 확인해주세요.")
+    
+    # 필수 컬럼 검사 (최소한 혈액형과 제제명/혈액명과 유사한 단어가 있는지 찾기)
+    bt_col, prep_col, date_col = find_columns(list(df.columns))
+    
+    # 대표 날짜 추출 (첫 행 기준)
+    record_date = datetime.now().date()
+    if date_col and not df.empty:
+        record_date = parse_record_date(df.iloc[0][date_col]) or record_date
+    
+    tally, unmapped_preps, rows_processed = map_inventory_rows(df[bt_col], df[prep_col])
+    return build_inventory_result(tally.to_dict(), unmapped_preps, rows_processed, record_date)
+
+
+def parse_excel_inventory_file(path: str) -> Dict[str, Any]:
+    """
+    parse_excel_inventory의 스트리밍 버전 (디스크의 .xlsx 경로)
+
+    openpyxl read-only 모드로 행을 순차로 읽어 EXCEL_STREAM_CHUNK_ROWS 단위로 매핑/집계 후 버리므로
+    시트 전체를 메모리에 올리지 않음 (수개월치 대용량 출고 내역도 메모리 일정).
+    .xlsx가 아니면 (openpyxl 미지원) 기존 parse_excel_inventory로 처리.
+    """
+    if not path.lower().endswith(".xlsx"):
+        with open(path, "rb") as f:
+            return parse_excel_inventory(f.read())
+
+    try:
+        wb = load_workbook(path, read_only=True, data_only=True)
+    except Exception as e:
+        raise ValueError("엑셀 파일을 읽을 수 없습니다. 올바른 파일인지 확인해주세요.")
+
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("엑셀 파일을 읽을 수 없습니다. 올바른 파일인지 확인해주세요.")
+        # 빈 헤더 셀은 pandas와 같은 이름으로 (컬럼 탐지 결과 동일)
+        cols = [c if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+        bt_col, prep_col, date_col = find_columns(cols)
+        bt_idx, prep_idx = cols.index(bt_col), cols.index(prep_col)
+        date_idx = cols.index(date_col) if date_col else None
+
+        record_date = None
+        tally: Dict[Tuple[str, str], int] = {}
+        unmapped_preps = set()
+        rows_processed = 0
+        bt_chunk, prep_chunk = [], []
+
+        def flush():
+            nonlocal rows_processed
+            chunk_tally, chunk_unmapped, chunk_rows = map_inventory_rows(
+                pd.Series(bt_chunk, dtype=object), pd.Series(prep_chunk, dtype=object)
+            )
+            for key, qty in chunk_tally.items():
+                tally[key] = tally.get(key, 0) + int(qty)
+            unmapped_preps.update(chunk_unmapped)
+            rows_processed += chunk_rows
+            bt_chunk.clear()
+            prep_chunk.clear()
+
+        width = len(cols)
+        for row in rows:
+            # 빈 행 무시 (pandas read_excel과 동일)
+            if not any(v is not None for v in row):
+                continue
+            row = tuple(row) + (None,) * (width - len(row))
+            if date_idx is not None and record_date is None:
+                # 대표 날짜 추출 (첫 행 기준)
+                record_date = parse_record_date(row[date_idx]) or datetime.now().date()
+            bt_chunk.append(row[bt_idx])
+            prep_chunk.append(row[prep_idx])
+            if len(bt_chunk) >= settings.EXCEL_STREAM_CHUNK_ROWS:
+                flush()
+        if bt_chunk:
+            flush()
+    finally:
+        wb.close()
+
+    return build_inventory_result(tally, unmapped_preps, rows_processed, record_date or datetime.now().date())
+
+
+async def spool_upload(upload, suffix: str = "", directory: Optional[str] = None) -> Tuple[str, str]:
+    """
+    업로드 파일을 청크 단위로 임시 파일에 기록하고 (경로, 파일 SHA-256) 반환 (호출자가 삭제)
+
+    요청 메모리에 파일 전체를 올리지 않고, 프로세스 풀 워커가 경로로 직접 읽을 수 있게 함.
+    해시는 기록하면서 함께 계산 (중복 업로드 확인용). directory 미지정 시 시스템 임시 디렉터리.
+    """
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=directory)
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = await upload.read(settings.UPLOAD_SPOOL_CHUNK_BYTES)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, digest.hexdigest()
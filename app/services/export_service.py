@@ -0,0 +1,205 @@
+"""
+재고 이력 컬럼형 내보내기 (Parquet / Arrow IPC stream) - QI 오프라인 분석용
+
+- 데이터셋: stock_log, inbound_history, daily_levels(inventory_daily_snapshot 일자별 마감 재고)
+- 기간/혈액형 필터는 SQL WHERE로 적용
+- 행은 서버 측 커서(yield_per → psycopg2 named cursor)에서 EXPORT_BATCH_SIZE 단위로 읽어
+  배치마다 RecordBatch로 변환해 바로 기록 → 전체 행 수와 무관하게 메모리 일정
+- Parquet은 배치 = row group, Arrow는 스트림 포맷(.arrows, footer 없음)
+"""
+from datetime import date, datetime, timedelta
+from typing import BinaryIO, Iterator, List, Optional, Sequence
+import logging
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database.models import BloodMaster, InboundHistory, InventoryDailySnapshot, StockLog
+from app.services.daily_snapshot_service import get_daily_levels
+
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    # format: (파일 확장자, media type)
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrows', 'application/vnd.apache.arrow.stream'),
+}
+
+EXPORT_SCHEMAS = {
+    'stock_log': pa.schema([
+        ('id', pa.int64()),
+        ('log_date', pa.timestamp('s')),
+        ('blood_type', pa.string()),
+        ('prep_id', pa.int32()),
+        ('preparation', pa.string()),
+        ('in_qty', pa.int32()),
+        ('out_qty', pa.int32()),
+        ('user_id', pa.int32()),
+        ('expiry_ok', pa.bool_()),
+        ('visual_ok', pa.bool_()),
+        ('remark', pa.string()),
+    ]),
+    'inbound_history': pa.schema([
+        ('id', pa.int64()),
+        ('receive_date', pa.date32()),
+        ('blood_type', pa.string()),
+        ('prep_id', pa.int32()),
+        ('preparation', pa.string()),
+        ('qty', pa.int32()),
+        ('created_at', pa.timestamp('s')),
+    ]),
+    'daily_levels': pa.schema([
+        ('date', pa.date32()),
+        ('blood_type', pa.string()),
+        ('prep_id', pa.int32()),
+        ('preparation', pa.string()),
+        ('qty', pa.int32()),
+    ]),
+}
+EXPORT_DATASETS = tuple(EXPORT_SCHEMAS)
+
+# daily_levels는 일자 구간 단위로 나눠 조회 (구간당 일수 × 셀 수 만큼만 메모리 사용)
+DAILY_LEVELS_CHUNK_DAYS = 31
+
+
+def _stock_log_query(start: Optional[date], end: Optional[date], blood_types: Optional[Sequence[str]]):
+    stmt = select(
+        StockLog.id, StockLog.log_date, StockLog.blood_type, StockLog.prep_id, BloodMaster.preparation,
+        StockLog.in_qty, StockLog.out_qty, StockLog.user_id, StockLog.expiry_ok, StockLog.visual_ok,
+        StockLog.remark
+    ).join(BloodMaster, BloodMaster.id == StockLog.prep_id)
+    if start:
+        stmt = stmt.where(StockLog.log_date >= datetime.combine(start, datetime.min.time()))
+    if end:
+        stmt = stmt.where(StockLog.log_date < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    if blood_types:
+        stmt = stmt.where(StockLog.blood_type.in_(blood_types))
+    return stmt.order_by(StockLog.id)
+
+
+def _inbound_query(start: Optional[date], end: Optional[date], blood_types: Optional[Sequence[str]]):
+    stmt = select(
+        InboundHistory.id, InboundHistory.receive_date, InboundHistory.blood_type, InboundHistory.prep_id,
+        BloodMaster.preparation, InboundHistory.qty, InboundHistory.created_at
+    ).join(BloodMaster, BloodMaster.id == InboundHistory.prep_id)
+    if start:
+        stmt = stmt.where(InboundHistory.receive_date >= start)
+    if end:
+        stmt = stmt.where(InboundHistory.receive_date <= end)
+    if blood_types:
+        stmt = stmt.where(InboundHistory.blood_type.in_(blood_types))
+    return stmt.order_by(InboundHistory.id)
+
+
+def _rows_to_batch(rows: List[tuple], schema: pa.Schema) -> pa.RecordBatch:
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema
+    )
+
+
+def _iter_daily_level_batches(db: Session, start: Optional[date], end: Optional[date],
+                              blood_types: Optional[Sequence[str]]) -> Iterator[pa.RecordBatch]:
+    schema = EXPORT_SCHEMAS['daily_levels']
+    if start is None:
+        start = db.query(func.min(InventoryDailySnapshot.snapshot_date)).scalar()
+        if start is None:
+            return
+    end = end or date.today()
+    prep_map = dict(db.query(BloodMaster.id, BloodMaster.preparation).all())
+
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(chunk_start + timedelta(days=DAILY_LEVELS_CHUNK_DAYS - 1), end)
+        levels = get_daily_levels(db, chunk_start, chunk_end, blood_types)
+        if len(levels.columns):
+            # (일자 × 셀) 행렬 → 일자-셀 롱 포맷 (일자 순)
+            long = levels.melt(ignore_index=False, value_name='qty').rename_axis('date').reset_index() \
+                .sort_values('date', kind='stable')
+            yield pa.RecordBatch.from_arrays([
+                pa.array(long['date'], type=pa.date32()),
+                pa.array(long['blood_type'], type=pa.string()),
+                pa.array(long['prep_id'], type=pa.int32()),
+                pa.array(long['prep_id'].map(prep_map), type=pa.string()),
+                pa.array(long['qty'], type=pa.int32()),
+            ], schema=schema)
+        chunk_start = chunk_end + timedelta(days=1)
+
+
+def iter_record_batches(db: Session, dataset: str, start: Optional[date] = None, end: Optional[date] = None,
+                        blood_types: Optional[Sequence[str]] = None,
+                        batch_size: Optional[int] = None) -> Iterator[pa.RecordBatch]:
+    """데이터셋 행을 서버 측 커서 배치 단위 RecordBatch로 생성"""
+    if dataset == 'daily_levels':
+        yield from _iter_daily_level_batches(db, start, end, blood_types)
+        return
+
+    stmt = _stock_log_query(start, end, blood_types) if dataset == 'stock_log' \
+        else _inbound_query(start, end, blood_types)
+    result = db.execute(stmt.execution_options(yield_per=batch_size or settings.EXPORT_BATCH_SIZE))
+    try:
+        for rows in result.partitions():
+            yield _rows_to_batch(rows, EXPORT_SCHEMAS[dataset])
+    finally:
+        result.close()
+
+
+class _ChunkSink:
+    """pyarrow 출력을 메모리에 잠시 모았다가 배치마다 꺼내는 쓰기 전용 파일 객체"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _open_writer(fmt: str, sink, schema: pa.Schema):
+    if fmt == 'parquet':
+        return pq.ParquetWriter(sink, schema, compression='zstd')
+    return pa.ipc.new_stream(sink, schema)
+
+
+def write_export(db: Session, dataset: str, fmt: str, sink: BinaryIO, **filters) -> int:
+    """
+    데이터셋을 파일 객체(sink)에 기록
+
+    Returns:
+        기록한 행 수
+    """
+    rows = 0
+    with _open_writer(fmt, pa.PythonFile(sink, mode='w'), EXPORT_SCHEMAS[dataset]) as writer:
+        for batch in iter_record_batches(db, dataset, **filters):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+
+def iter_export_bytes(db: Session, dataset: str, fmt: str, **filters) -> Iterator[bytes]:
+    """데이터셋을 배치마다 인코딩된 바이트 조각으로 생성 (HTTP 스트리밍 응답용)"""
+    sink = _ChunkSink()
+    rows = 0
+    with _open_writer(fmt, pa.PythonFile(sink, mode='w'), EXPORT_SCHEMAS[dataset]) as writer:
+        for batch in iter_record_batches(db, dataset, **filters):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    # Parquet footer / Arrow 스트림 종료 표시
+    yield sink.drain()
+    logger.info(f"{dataset} 내보내기 완료 ({fmt}): {rows}행")
@@ -0,0 +1,244 @@
+"""
+(통계용) 엑셀 입고 업로드 처리 - 동기 업로드 API와 백그라운드 작업(upload_jobs)이 공유
+
+- 스풀된 파일들을 CPU 프로세스 풀에서 동시에 파싱 (동시 제출 수 = 워커 수)
+- 성공한 파일의 입고 내역을 한 트랜잭션으로 저장, 파일별 처리 결과 반환
+- 중복 업로드 차단 (inbound_upload_digest)
+  - 파싱 전: 파일 바이트 SHA-256이 이미 저장된 파일이면 파싱 없이 거부
+  - 파싱 후: 정규화된 파싱 결과(일자 + 혈액형/제제/수량) SHA-256이 같으면 거부 (재저장한 같은 시트)
+  - 같은 날짜라도 내용이 다른 파일은 허용
+  - 해시 기록이 없는 기존 입고 일자(테이블 도입 전 업로드)는 기존처럼 날짜 기준으로 거부
+"""
+import asyncio
+import hashlib
+import json
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.process_pool import cpu_pool, CpuPoolBusyError, CpuTaskTimeoutError
+from app.database.models import InboundHistory, InboundUploadDigest
+from app.services.excel_service import parse_excel_inventory_file
+from app.services.reference_cache import reference_cache
+
+
+class InboundUploadError(Exception):
+    """모든 파일이 실패한 업로드 (HTTP 상태 코드 포함)"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+class DuplicateUploadError(ValueError):
+    """이미 저장된 파일(또는 같은 요청의 다른 파일)과 동일한 업로드"""
+
+
+def content_digest(result: Dict, receive_date) -> str:
+    """파싱 결과 정규화(입고일 + 정렬된 혈액형/제제/수량) SHA-256 - 바이트만 다른 같은 시트 식별용"""
+    canonical = json.dumps({
+        "receive_date": receive_date.strftime("%Y-%m-%d"),
+        "items": sorted([i["blood_type"], i["preparation"], i["qty"], i["is_mapped"]] for i in result["items"]),
+    }, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def find_duplicate_uploads(db: Session, filenames: List[str], file_hashes: List[str]) -> Dict[int, DuplicateUploadError]:
+    """
+    파싱 전 중복 확인 - 파일 해시가 이미 저장됐거나 같은 요청에서 앞서 나온 파일 (1회 조회)
+
+    Returns:
+        파일 인덱스 → 거부 사유 (parse_uploaded_files의 skip으로 전달)
+    """
+    known = {
+        file_sha256: (filename, receive_date)
+        for file_sha256, filename, receive_date in db.query(
+            InboundUploadDigest.file_sha256, InboundUploadDigest.filename, InboundUploadDigest.receive_date
+        ).filter(InboundUploadDigest.file_sha256.in_(set(file_hashes))).all()
+    } if file_hashes else {}
+
+    duplicates = {}
+    first_index = {}
+    for index, file_hash in enumerate(file_hashes):
+        if file_hash in known:
+            filename, receive_date = known[file_hash]
+            duplicates[index] = DuplicateUploadError(
+                f"이미 업로드된 파일입니다 ({filename}, {receive_date} 입고). 중복 업로드를 방지하기 위해 처리를 중단합니다."
+            )
+        elif file_hash in first_index:
+            duplicates[index] = DuplicateUploadError(
+                f"같은 요청의 {filenames[first_index[file_hash]]} 파일과 내용이 동일합니다."
+            )
+        else:
+            first_index[file_hash] = index
+    return duplicates
+
+
+async def parse_uploaded_files(paths: List[str], on_parsed: Optional[Callable[[int], None]] = None,
+                               skip: Optional[Dict[int, BaseException]] = None) -> list:
+    """
+    스풀된 엑셀 파일들을 CPU 프로세스 풀에서 동시에 파싱 (파일 순서대로 결과 또는 예외)
+
+    동시 제출 수는 워커 수로 제한 → 한 요청이 풀 대기열 상한을 혼자 채우지 않음.
+    on_parsed: 파일 하나가 끝날 때마다 누적 완료 수로 호출 (진행률 보고용)
+    skip: 파싱하지 않고 결과 자리에 그대로 둘 예외 (파일 인덱스 → 예외, 중복 업로드 등)
+    """
+    semaphore = asyncio.Semaphore(max(1, cpu_pool.max_workers))
+    skip = skip or {}
+    done = 0
+
+    async def parse(index: int, path: str):
+        nonlocal done
+        try:
+            if index in skip:
+                raise skip[index]
+            async with semaphore:
+                return await cpu_pool.run(parse_excel_inventory_file, path)
+        finally:
+            done += 1
+            if on_parsed:
+                on_parsed(done)
+
+    return await asyncio.gather(*(parse(i, path) for i, path in enumerate(paths)), return_exceptions=True)
+
+
+def upload_error(filename: str, e: BaseException) -> Tuple[int, str]:
+    """파싱 예외 → (HTTP 상태 코드, 메시지)"""
+    if isinstance(e, CpuPoolBusyError):
+        return 503, str(e)
+    if isinstance(e, CpuTaskTimeoutError):
+        return 504, f"엑셀 파일({filename}) {str(e)}"
+    if isinstance(e, ValueError):
+        return 400, str(e)
+    return 400, f"엑셀 파일({filename}) 처리 중 오류: {str(e)}"
+
+
+def save_inbound_uploads(db: Session, filenames: List[str], parsed: list, file_hashes: List[str]) -> Dict:
+    """
+    파싱 결과를 입고 내역으로 저장 (한 트랜잭션, 커밋 포함) - 파일/내용 해시도 함께 기록
+
+    Raises:
+        InboundUploadError: 저장된 파일 없이 실패만 있는 경우 (첫 오류)
+
+    Returns:
+        업로드 응답 (파일별 결과 files 포함)
+    """
+    # 혈액제제명 -> prep_id 매핑 (기준정보 캐시)
+    preps = reference_cache.get(db).preps.values()
+    prep_map = {p.preparation: p.id for p in preps}
+
+    dates = [
+        None if isinstance(result, BaseException)
+        else datetime.strptime(result["record_date"], "%Y-%m-%d").date() if result.get("record_date")
+        else datetime.now().date()
+        for result in parsed
+    ]
+    contents = [
+        None if isinstance(result, BaseException) else content_digest(result, excel_date)
+        for result, excel_date in zip(parsed, dates)
+    ]
+
+    # 내용 해시 중복 + 해시 기록 없는 기존 입고 일자 (각 1회 조회)
+    parsed_dates = {d for d in dates if d is not None}
+    known_contents = {
+        c for (c,) in db.query(InboundUploadDigest.content_sha256).filter(
+            InboundUploadDigest.content_sha256.in_({c for c in contents if c})
+        ).all()
+    } if parsed_dates else set()
+    legacy_dates = set()
+    if parsed_dates:
+        inbound_dates = {
+            d for (d,) in db.query(InboundHistory.receive_date).filter(
+                InboundHistory.receive_date.in_(parsed_dates)
+            ).distinct().all()
+        }
+        digest_dates = {
+            d for (d,) in db.query(InboundUploadDigest.receive_date).filter(
+                InboundUploadDigest.receive_date.in_(parsed_dates)
+            ).distinct().all()
+        }
+        legacy_dates = inbound_dates - digest_dates
+
+    file_results = []
+    errors = []
+    inbound_rows = []
+    digest_rows = []
+    saved_contents = set()
+    for filename, result, excel_date, file_hash, content in zip(filenames, parsed, dates, file_hashes, contents):
+        if isinstance(result, BaseException):
+            code, message = upload_error(filename, result)
+            errors.append((code, message))
+            file_results.append({
+                "filename": filename,
+                "status": "duplicate" if isinstance(result, DuplicateUploadError) else "error",
+                "message": message
+            })
+            continue
+
+        if excel_date in legacy_dates:
+            message = f"이미 {excel_date} 날짜의 입고 내역이 존재합니다. 중복 업로드를 방지하기 위해 처리를 중단합니다."
+        elif content in known_contents or content in saved_contents:
+            message = f"{excel_date} 입고 내용이 이미 업로드된 파일과 동일합니다. 중복 업로드를 방지하기 위해 처리를 중단합니다."
+        else:
+            message = None
+        if message:
+            errors.append((400, message))
+            file_results.append({
+                "filename": filename, "status": "duplicate",
+                "date": excel_date.strftime("%Y-%m-%d"), "message": message
+            })
+            continue
+
+        saved_contents.add(content)
+        qty_saved = 0
+        for item in result["items"]:
+            if item["is_mapped"] and item["preparation"] in prep_map:
+                inbound_rows.append({
+                    "receive_date": excel_date,
+                    "blood_type": item["blood_type"],
+                    "prep_id": prep_map[item["preparation"]],
+                    "qty": item["qty"]
+                })
+                qty_saved += item["qty"]
+        digest_rows.append({
+            "file_sha256": file_hash, "content_sha256": content, "filename": filename[:255],
+            "receive_date": excel_date, "qty": qty_saved
+        })
+        file_results.append({
+            "filename": filename, "status": "saved",
+            "date": excel_date.strftime("%Y-%m-%d"),
+            "rows_processed": result["total_rows_processed"],
+            "qty_saved": qty_saved,
+            "unmapped": result["unmapped"]
+        })
+
+    saved = [r for r in file_results if r["status"] == "saved"]
+    if not saved and errors:
+        raise InboundUploadError(*errors[0])
+
+    try:
+        if inbound_rows:
+            db.execute(insert(InboundHistory), inbound_rows)
+        if digest_rows:
+            db.execute(insert(InboundUploadDigest), digest_rows)
+        db.commit()
+    except IntegrityError:
+        # 같은 파일이 동시에 업로드되어 다른 요청이 먼저 저장함
+        db.rollback()
+        raise InboundUploadError(409, "같은 파일이 동시에 업로드되었습니다. 업로드 내역을 확인해 주세요.")
+    except Exception as e:
+        db.rollback()
+        raise InboundUploadError(500, f"입고 통계 저장 실패: {str(e)}")
+
+    return {
+        "message": "입고 통계 저장 완료",
+        "files_processed": len(saved),
+        "files_failed": len(file_results) - len(saved),
+        "total_qty_saved": sum(r["qty_saved"] for r in saved),
+        "date": saved[-1]["date"] if saved else None,
+        "files": file_results
+    }
@@ -0,0 +1,119 @@
+"""
+재고 현황 스냅샷 캐시 - /api/inventory/status 용 프로세스 내 write-through 캐시
+
+- 최초 조회(cold) 또는 TTL 경과(stale) 시에만 DB에서 매트릭스를 적재
+- 재고 저장 경로(update_inventory_and_log, bulk-save)가 커밋 직후 셀 단위로 갱신
+- 기준정보(SafetyConfig, rbc_ratio 등) 변경 시 invalidate() 로 폐기
+- TTL은 다른 워커 프로세스에서 발생한 변경에 대한 안전망
+"""
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class InventorySnapshotCache:
+    """버전이 붙은 재고 매트릭스 스냅샷 (thread-safe)"""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._cells: Optional[Dict[Tuple[str, int], Dict]] = None
+        self._rbc_ratio: float = 0.5
+        self._loaded_at: float = 0.0
+        self.version: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def _is_fresh(self) -> bool:
+        return self._cells is not None and (time.monotonic() - self._loaded_at) < self.ttl_seconds
+
+    def _export(self) -> Tuple[Optional[int], List[Dict], int, float]:
+        items = [dict(cell) for cell in self._cells.values()]
+        alert_count = sum(1 for cell in items if cell['is_alert'])
+        return self.version, items, alert_count, self._rbc_ratio
+
+    def get_status(self, db: Session) -> Tuple[Optional[int], List[Dict], int, float]:
+        """
+        스냅샷이 유효하면 DB 조회 없이 반환, 아니면 DB에서 재적재
+
+        Returns:
+            (version, items, alert_count, rbc_ratio) - 캐시에 담기지 않은 응답은 version=None
+        """
+        with self._lock:
+            if self._is_fresh():
+                self.hits += 1
+                return self._export()
+            self.misses += 1
+            version_at_miss = self.version
+
+        # DB 조회는 락 밖에서 수행 (느린 왕복 동안 다른 요청을 막지 않음)
+        from app.services.inventory_service import get_inventory_status
+        items, alert_count, rbc_ratio = get_inventory_status(db)
+
+        with self._lock:
+            if self.version != version_at_miss:
+                # 조회 도중 다른 요청이 커밋함 → 방금 읽은 값은 캐시하지 않음
+                return None, items, alert_count, rbc_ratio
+            self._cells = {(item['blood_type'], item['prep_id']): item for item in items}
+            self._rbc_ratio = rbc_ratio
+            self._loaded_at = time.monotonic()
+            self.version += 1
+            return self._export()
+
+    def apply_changes(self, changes: Iterable[Tuple[str, int, int, Optional[str], int]]) -> Optional[int]:
+        """
+        커밋된 재고 변경을 스냅샷에 반영 (write-through)
+
+        Args:
+            changes: (blood_type, prep_id, new_qty, remark, row_version) 목록 (remark=None → 기존 비고 유지)
+
+        Returns:
+            반영 후 스냅샷 버전 (스냅샷이 cold이거나 폐기된 경우 None)
+        """
+        with self._lock:
+            if self._cells is None:
+                return None
+            for blood_type, prep_id, new_qty, remark, row_version in changes:
+                cell = self._cells.get((blood_type, prep_id))
+                if cell is None:
+                    # 스냅샷에 없는 셀(신규 재고 행) → 다음 조회 시 DB에서 재적재
+                    self._cells = None
+                    self.version += 1
+                    return None
+                cell['current_qty'] = new_qty
+                cell['version'] = row_version
+                if remark is not None:
+                    cell['remark'] = remark
+                cell['is_alert'] = new_qty < cell['alert_threshold']
+                cell['request_qty'] = max(0, cell['target_qty'] - new_qty)
+            self.version += 1
+            return self.version
+
+    def invalidate(self) -> None:
+        """스냅샷 폐기 (기준정보 변경 등)"""
+        with self._lock:
+            self._cells = None
+            self.version += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'version': self.version,
+                'warm': self._is_fresh(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 3) if total else 0.0,
+                'ttl_seconds': self.ttl_seconds,
+            }
+
+
+inventory_snapshot = InventorySnapshotCache(ttl_seconds=settings.INVENTORY_CACHE_TTL_SECONDS)
@@ -0,0 +1,95 @@
+"""
+재고 변경 이벤트 브로드캐스터 - /api/inventory/stream (Server-Sent Events) 용
+
+- 재고 저장 경로(bulk-save, update_inventory_and_log)가 커밋 직후 publish
+- 구독자별 asyncio.Queue로 메모리에서 fan-out (DB 폴링 없음)
+- publish는 동기 핸들러(threadpool)에서도 호출 가능 (call_soon_threadsafe)
+- 느린 구독자의 큐가 가득 차면 가장 오래된 이벤트를 버림 (version 불연속으로 감지 가능)
+"""
+import asyncio
+import json
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class InventoryEventBroker:
+    """프로세스 내 재고 이벤트 pub/sub"""
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+
+    def subscribe(self) -> asyncio.Queue:
+        """현재 이벤트 루프에 구독 큐 등록 (async 컨텍스트에서 호출)"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers = [(loop, q) for loop, q in self._subscribers if q is not queue]
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: Dict) -> None:
+        if queue.full():
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        queue.put_nowait(event)
+
+    def publish(self, event_type: str, data: Dict) -> None:
+        """모든 구독자에게 이벤트 전달"""
+        event = {'event': event_type, 'data': data}
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # 이벤트 루프가 종료된 구독자 정리
+                self.unsubscribe(queue)
+
+    def publish_cells(self, changes: Iterable[Tuple[str, int, int, int]], version: Optional[int]) -> None:
+        """
+        커밋된 셀 변경 발행
+
+        Args:
+            changes: (blood_type, prep_id, new_qty, row_version) 목록
+            version: 반영 후 재고 스냅샷 버전 (캐시가 cold면 None)
+        """
+        for blood_type, prep_id, new_qty, row_version in changes:
+            self.publish('cell', {
+                'blood_type': blood_type,
+                'prep_id': prep_id,
+                'qty': new_qty,
+                'version': version,
+                'row_version': row_version
+            })
+
+    def publish_danger_alerts(self, danger_alerts: List[Dict]) -> None:
+        """RBC 위험재고 알람 발행"""
+        for alert in danger_alerts:
+            self.publish('danger', alert)
+
+
+def format_sse(event: Dict) -> str:
+    """이벤트 dict → SSE 와이어 포맷"""
+    payload = json.dumps(event['data'], ensure_ascii=False, default=str)
+    return f"event: {event['event']}\ndata: {payload}\n\n"
+
+
+inventory_events = InventoryEventBroker()
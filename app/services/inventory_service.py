@@ -2,7 +2,7 @@
 재고 관리 서비스 - RBC 재고비 기반 적정재고 계산
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import insert, literal, select, true, update, values, column, Integer
 from datetime import datetime
 from math import ceil
 from typing import List, Dict, Optional, Tuple
@@ -12,6 +12,10 @@ from app.database.models import (
     BloodMaster, SafetyConfig, SystemSettings, Inventory,
     StockLog, MasterConfig, InventoryRatioHistory
 )
+from app.services.inventory_cache import inventory_snapshot
+from app.services.reference_cache import reference_cache
+from app.services.inventory_events import inventory_events
+from app.services.daily_snapshot_service import record_daily_levels, snapshot_upsert_statement
 
 
 logger = logging.getLogger(__name__)
@@ -27,6 +31,8 @@ def get_rbc_factors(db: Session, blood_type: str = None, prep_id: int = None) ->
     """
     RBC 재고비 설정 조회 (우선순위: 혈액형/제제 특정값 > 공통값 > 기본값)
 
+    우선순위는 기준정보 캐시 적재 시 RbcFactorResolver가 미리 적용해 두므로 O(1) 조회.
+
     Args:
         blood_type: 혈액형 (None=공통)
         prep_id: 제제 ID (None=공통)
@@ -34,59 +40,12 @@ def get_rbc_factors(db: Session, blood_type: str = None, prep_id: int = None) ->
     Returns:
         {'daily_consumption_rate': float, 'safety_factor': float}
     """
-    defaults = {'daily_consumption_rate': 3.0, 'safety_factor': 2.0}
-
-    # 1. 혈액형/제제별 특정 설정 조회
-    if blood_type and prep_id:
-        specific = db.query(MasterConfig).filter(
-            MasterConfig.blood_type == blood_type,
-            MasterConfig.prep_id == prep_id,
-            MasterConfig.config_key == 'rbc_factors'
-        ).first()
-        if specific and specific.daily_consumption_rate is not None:
-            return {
-                'daily_consumption_rate': specific.daily_consumption_rate,
-                'safety_factor': specific.safety_factor or defaults['safety_factor']
-            }
-
-    # 2. 공통 설정 조회 (blood_type=None, prep_id=None)
-    common = db.query(MasterConfig).filter(
-        MasterConfig.blood_type.is_(None),
-        MasterConfig.prep_id.is_(None),
-        MasterConfig.config_key == 'rbc_factors'
-    ).first()
-
-    if common and common.daily_consumption_rate is not None:
-        return {
-            'daily_consumption_rate': common.daily_consumption_rate,
-            'safety_factor': common.safety_factor or defaults['safety_factor']
-        }
-
-    # 3. legacy: rbc_ratio_percent 키 조회 (하위 호환)
-    ratio_config = db.query(MasterConfig).filter(
-        MasterConfig.config_key == 'rbc_ratio_percent'
-    ).first()
-    if ratio_config:
-        try:
-            ratio = float(ratio_config.config_value) / 100.0
-            return {'daily_consumption_rate': defaults['daily_consumption_rate'], 'safety_factor': ratio * 4}
-        except ValueError:
-            pass
-
-    return defaults
+    return reference_cache.get(db).rbc.factors(blood_type, prep_id)
 
 
 def get_rbc_ratio(db: Session) -> float:
     """Legacy: RBC 비율 조회 (0.0 ~ 1.0), 기본값 0.5"""
-    config = db.query(MasterConfig).filter(
-        MasterConfig.config_key == 'rbc_ratio_percent'
-    ).first()
-    if config:
-        try:
-            return float(config.config_value) / 100.0
-        except ValueError:
-            pass
-    return 0.5
+    return reference_cache.get(db).rbc.rbc_ratio
 
 
 # ==================== RBC 적정재고 계산 ====================
@@ -107,15 +66,16 @@ def calculate_target_qty(daily_consumption_rate: float, safety_factor: float,
 
 
 def calculate_rbc_targets(db: Session, blood_type: str) -> Dict[str, int]:
-    """혈액형별 PRBC/Prefiltered 적정재고 계산"""
-    factors = get_rbc_factors(db, blood_type)
+    """혈액형별 PRBC/Prefiltered 적정재고 계산 (기준정보 캐시만 사용, 추가 쿼리 없음)"""
+    resolver = reference_cache.get(db).rbc
+    factors = resolver.factors(blood_type)
     dcr = factors['daily_consumption_rate']
     sf = factors['safety_factor']
 
     target = calculate_target_qty(dcr, sf, blood_type, is_rbc=True)
 
     # PRBC / Prefiltered 비율 분배 (legacy rbc_ratio_percent 활용)
-    ratio = get_rbc_ratio(db)
+    ratio = resolver.rbc_ratio
     prbc_target = round(target * ratio)
     prefiltered_target = target - prbc_target  # 합계 보장
 
@@ -135,19 +95,22 @@ def check_alert_status(current_qty: int, alert_threshold: int) -> bool:
 # ==================== 재고 현황 ====================
 
 def get_inventory_status(db: Session) -> Tuple[List[Dict], int, float]:
-    """전체 재고 현황 및 경고 현황 조회"""
+    """
+    전체 재고 현황 및 경고 현황 조회
+
+    Inventory만 한 번 조회하고, 제제/적정재고/rbc_ratio는 기준정보 캐시에서 붙여
+    매트릭스를 메모리에서 구성한다. 제제 수와 무관하게 DB 왕복은 1회.
+    """
+    refs = reference_cache.get(db)
+    inventories = db.query(Inventory).order_by(Inventory.id).all()
     rbc_ratio = get_rbc_ratio(db)
-    inventories = db.query(Inventory).all()
 
     items = []
     alert_count = 0
 
     for inv in inventories:
-        blood_master = db.query(BloodMaster).filter(BloodMaster.id == inv.prep_id).first()
-        safety_config = db.query(SafetyConfig).filter(
-            SafetyConfig.blood_type == inv.blood_type,
-            SafetyConfig.prep_id == inv.prep_id
-        ).first()
+        blood_master = refs.prep(inv.prep_id)
+        safety_config = refs.safety(inv.blood_type, inv.prep_id)
 
         if not blood_master or not safety_config:
             continue
@@ -172,6 +135,7 @@ def get_inventory_status(db: Session) -> Tuple[List[Dict], int, float]:
             'preparation': blood_master.preparation,
             'component': blood_master.component,
             'current_qty': inv.current_qty,
+            'version': inv.version,
             'safety_qty': safety_config.safety_qty,
             'alert_threshold': safety_config.alert_threshold,
             'target_qty': target_qty,
@@ -189,36 +153,127 @@ def update_inventory_and_log(
     db: Session, blood_type: str, prep_id: int,
     in_qty: int, out_qty: int, remark: str
 ) -> Tuple[Inventory, StockLog, int]:
-    """재고 업데이트 및 로그 기록"""
-    inventory = db.query(Inventory).filter(
-        Inventory.blood_type == blood_type,
-        Inventory.prep_id == prep_id
-    ).first()
+    """
+    재고 업데이트 및 로그 기록 (원자적 증감)
 
-    if not inventory:
-        raise ValueError(f"Inventory not found for {blood_type} type, prep_id {prep_id}")
+    UPDATE inventory SET current_qty = current_qty + :delta ... WHERE current_qty + :delta >= 0
+    으로 DB에서 직접 증감하므로 동시 입력 시에도 갱신 손실이 없다.
+    PostgreSQL에서는 UPDATE ... RETURNING, StockLog INSERT, 일자별 스냅샷 upsert를
+    data-modifying CTE 하나로 묶어 1회 왕복으로 처리한다 (그 외 DB는 같은 트랜잭션에서 여러 문장).
 
-    previous_qty = inventory.current_qty
-    new_qty = previous_qty + in_qty - out_qty
+    Returns:
+        (갱신된 Inventory, 생성된 StockLog, 이전 재고량) - 세션에 연결되지 않은 값 객체
+    """
+    delta = in_qty - out_qty
+    now = datetime.now()
 
-    if new_qty < 0:
+    upd = update(Inventory).where(
+        Inventory.blood_type == blood_type,
+        Inventory.prep_id == prep_id,
+        Inventory.current_qty + delta >= 0
+    ).values(
+        current_qty=Inventory.current_qty + delta,
+        version=Inventory.version + 1,
+        remark=remark,
+        updated_at=now
+    ).returning(Inventory.id, Inventory.current_qty, Inventory.version)
+
+    log_values = {
+        'log_date': now, 'blood_type': blood_type, 'prep_id': prep_id,
+        'in_qty': in_qty, 'out_qty': out_qty, 'remark': remark, 'created_at': now
+    }
+
+    if db.get_bind().dialect.name == 'postgresql':
+        upd_cte = upd.cte('upd')
+        log_cte = insert(StockLog).from_select(
+            list(log_values),
+            select(*(literal(v) for v in log_values.values())).select_from(upd_cte)
+        ).returning(StockLog.id).cte('log')
+        snap_cte = snapshot_upsert_statement(
+            select(literal(now.date()), literal(blood_type), literal(prep_id), upd_cte.c.current_qty, literal(now))
+            .select_from(upd_cte)
+        ).cte('snap')
+        row = db.execute(
+            select(upd_cte.c.id, upd_cte.c.current_qty, upd_cte.c.version, log_cte.c.id.label('log_id'))
+            .select_from(upd_cte).join(log_cte, true()).add_cte(snap_cte)
+        ).first()
+    else:
+        updated = db.execute(upd).first()
+        row = None
+        if updated:
+            log_id = db.execute(insert(StockLog).values(**log_values).returning(StockLog.id)).scalar_one()
+            record_daily_levels(db, [(blood_type, prep_id, updated.current_qty)], now)
+            row = (updated.id, updated.current_qty, updated.version, log_id)
+
+    if row is None:
+        # 갱신된 행 없음 → 원인 판별 (오류 경로에서만 추가 조회)
+        db.rollback()
+        previous_qty = db.query(Inventory.current_qty).filter(
+            Inventory.blood_type == blood_type,
+            Inventory.prep_id == prep_id
+        ).scalar()
+        if previous_qty is None:
+            raise ValueError(f"Inventory not found for {blood_type} type, prep_id {prep_id}")
         raise ValueError(f"재고 부족. 현재: {previous_qty}, 출고 요청: {out_qty}")
 
-    inventory.current_qty = new_qty
-    inventory.remark = remark
-    inventory.updated_at = datetime.now()
-
-    stock_log = StockLog(
-        log_date=datetime.now(),
-        blood_type=blood_type,
-        prep_id=prep_id,
-        in_qty=in_qty,
-        out_qty=out_qty,
-        remark=remark
-    )
-    db.add(stock_log)
     db.commit()
-    db.refresh(inventory)
-    db.refresh(stock_log)
+    inventory_id, new_qty, row_version, log_id = row
+
+    inventory = Inventory(
+        id=inventory_id, blood_type=blood_type, prep_id=prep_id,
+        current_qty=new_qty, version=row_version, remark=remark, updated_at=now
+    )
+    stock_log = StockLog(id=log_id, **log_values)
+
+    version = inventory_snapshot.apply_changes([(blood_type, prep_id, new_qty, remark, row_version)])
+    inventory_events.publish_cells([(blood_type, prep_id, new_qty, row_version)], version)
 
-    return inventory, stock_log, previous_qty
+    return inventory, stock_log, new_qty - delta
+
+
+def conditional_update_inventory(
+    db: Session, updates: Dict[int, Tuple[int, int]], now: datetime
+) -> Dict[int, int]:
+    """
+    버전 조건부 재고 일괄 갱신 (낙관적 동시성)
+
+    각 행은 version이 기대값과 같을 때만 current_qty를 덮어쓰고 version을 +1 한다.
+    PostgreSQL에서는 UPDATE ... FROM (VALUES ...) RETURNING 한 문장으로 처리하므로
+    행 잠금이나 재조회 없이 어떤 셀이 충돌했는지 알 수 있다.
+
+    Args:
+        updates: inventory.id → (새 수량, 기대 version)
+
+    Returns:
+        갱신 성공한 inventory.id → 새 version (누락된 id = 충돌)
+    """
+    if not updates:
+        return {}
+
+    if db.get_bind().dialect.name == 'postgresql':
+        v = values(
+            column('id', Integer), column('qty', Integer), column('expected', Integer), name='v'
+        ).data([(inv_id, qty, expected) for inv_id, (qty, expected) in updates.items()])
+        stmt = update(Inventory).where(
+            Inventory.id == v.c.id,
+            Inventory.version == v.c.expected
+        ).values(
+            current_qty=v.c.qty,
+            version=Inventory.version + 1,
+            updated_at=now
+        ).returning(Inventory.id, Inventory.version)
+        rows = db.execute(stmt, execution_options={'synchronize_session': False}).all()
+        return {inv_id: version for inv_id, version in rows}
+
+    new_versions = {}
+    for inv_id, (qty, expected) in updates.items():
+        result = db.execute(
+            update(Inventory).where(
+                Inventory.id == inv_id,
+                Inventory.version == expected
+            ).values(current_qty=qty, version=expected + 1, updated_at=now),
+            execution_options={'synchronize_session': False}
+        )
+        if result.rowcount == 1:
+            new_versions[inv_id] = expected + 1
+    return new_versions
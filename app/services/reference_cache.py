@@ -0,0 +1,246 @@
+"""
+기준정보 캐시 - BloodMaster / SafetyConfig / MasterConfig 프로세스 전역 캐시
+
+- 기동 시(lifespan) 적재, 이후 서비스/라우터는 DB 대신 이 캐시를 조회
+- 기준정보 변경 API(app/api/config.py)는 커밋 후 invalidate() 호출
+- TTL 경과 시 재적재 (다른 워커/직접 SQL 변경에 대한 안전망)
+- ORM 객체가 아닌 불변 값 객체로 보관하므로 세션과 무관하게 공유 가능
+"""
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database.models import BloodMaster, SafetyConfig, MasterConfig
+
+
+logger = logging.getLogger(__name__)
+
+BLOOD_TYPES = ['A', 'B', 'O', 'AB']
+DEFAULT_RBC_FACTORS = {'daily_consumption_rate': 3.0, 'safety_factor': 2.0}
+DEFAULT_RBC_RATIO = 0.5
+
+
+@dataclass(frozen=True)
+class PrepRef:
+    """혈액제제 (BloodMaster)"""
+    id: int
+    component: str
+    preparation: str
+
+
+@dataclass(frozen=True)
+class SafetyRef:
+    """적정재고/알람기준 (SafetyConfig)"""
+    blood_type: str
+    prep_id: int
+    safety_qty: int
+    alert_threshold: int
+
+
+@dataclass(frozen=True)
+class ConfigRef:
+    """마스터 설정 (MasterConfig)"""
+    id: int
+    blood_type: Optional[str]
+    prep_id: Optional[int]
+    config_key: str
+    config_value: str
+    daily_consumption_rate: Optional[float]
+    safety_factor: Optional[float]
+    danger_factor: Optional[float]
+    updated_at: Optional[datetime]
+
+
+class ReferenceData:
+    """한 시점의 기준정보 스냅샷 (읽기 전용 조회 인덱스 포함)"""
+
+    def __init__(self, preps: List[PrepRef], safety_configs: List[SafetyRef], configs: List[ConfigRef]):
+        self.preps: Dict[int, PrepRef] = {p.id: p for p in preps}
+        self._prep_by_name: Dict[str, PrepRef] = {}
+        for p in preps:
+            self._prep_by_name.setdefault(p.preparation, p)
+        self.safety_configs: Dict[Tuple[str, int], SafetyRef] = {
+            (sc.blood_type, sc.prep_id): sc for sc in safety_configs
+        }
+        self._configs: Dict[Tuple[Optional[str], Optional[int], str], ConfigRef] = {}
+        self._configs_by_key: Dict[str, List[ConfigRef]] = {}
+        for c in configs:
+            self._configs.setdefault((c.blood_type, c.prep_id, c.config_key), c)
+            self._configs_by_key.setdefault(c.config_key, []).append(c)
+        self.rbc = RbcFactorResolver(self)
+
+    def prep(self, prep_id: int) -> Optional[PrepRef]:
+        return self.preps.get(prep_id)
+
+    def prep_by_name(self, preparation: str) -> Optional[PrepRef]:
+        return self._prep_by_name.get(preparation)
+
+    def prep_ids(self, preparations: Iterable[str]) -> List[int]:
+        """제제명 목록 → 존재하는 제제 ID 목록"""
+        names = set(preparations)
+        return [p.id for p in self.preps.values() if p.preparation in names]
+
+    def safety(self, blood_type: str, prep_id: int) -> Optional[SafetyRef]:
+        return self.safety_configs.get((blood_type, prep_id))
+
+    def config(self, config_key: str, blood_type: Optional[str] = None,
+               prep_id: Optional[int] = None) -> Optional[ConfigRef]:
+        """범위(blood_type/prep_id)가 정확히 일치하는 설정 (None=공통)"""
+        return self._configs.get((blood_type, prep_id, config_key))
+
+    def configs(self, config_key: str) -> List[ConfigRef]:
+        """해당 키의 모든 설정 행 (ID 순)"""
+        return self._configs_by_key.get(config_key, [])
+
+
+def parse_rbc_ratio(config_value: Optional[str]) -> float:
+    """rbc_ratio_percent 설정값(문자열) → 비율 (0.0 ~ 1.0), 파싱 실패 시 기본값 0.5"""
+    if config_value is not None:
+        try:
+            return float(config_value) / 100.0
+        except ValueError:
+            pass
+    return DEFAULT_RBC_RATIO
+
+
+class RbcFactorResolver:
+    """
+    rbc_factors 우선순위를 미리 적용한 (blood_type, prep_id) → 재고비 테이블
+
+    우선순위: 혈액형+제제 특정값 > 공통값(NULL/NULL) > legacy rbc_ratio_percent > 기본값.
+    기준정보 적재 시 한 번 계산되며 이후 조회는 O(1) dict 조회.
+    """
+
+    def __init__(self, refs: ReferenceData):
+        ratio_configs = refs.configs('rbc_ratio_percent')
+        legacy_value = ratio_configs[0].config_value if ratio_configs else None
+        self.rbc_ratio: float = parse_rbc_ratio(legacy_value)
+
+        # 혈액형/제제 미지정 또는 특정값 없는 경우의 기본 결과 (공통 > legacy > 기본값)
+        common = refs.config('rbc_factors')
+        if common and common.daily_consumption_rate is not None:
+            self.fallback = {
+                'daily_consumption_rate': common.daily_consumption_rate,
+                'safety_factor': common.safety_factor or DEFAULT_RBC_FACTORS['safety_factor']
+            }
+        elif legacy_value is not None and _is_number(legacy_value):
+            self.fallback = {
+                'daily_consumption_rate': DEFAULT_RBC_FACTORS['daily_consumption_rate'],
+                'safety_factor': parse_rbc_ratio(legacy_value) * 4
+            }
+        else:
+            self.fallback = dict(DEFAULT_RBC_FACTORS)
+
+        # 전체 혈액형 × 제제 테이블 (특정값이 있으면 덮어씀)
+        self._table: Dict[Tuple[str, int], Dict[str, float]] = {
+            (bt, prep_id): self.fallback for bt in BLOOD_TYPES for prep_id in refs.preps
+        }
+        specific_seen = set()
+        for c in refs.configs('rbc_factors'):
+            key = (c.blood_type, c.prep_id)
+            if not (c.blood_type and c.prep_id) or key in specific_seen:
+                continue
+            specific_seen.add(key)
+            if c.daily_consumption_rate is not None:
+                self._table[key] = {
+                    'daily_consumption_rate': c.daily_consumption_rate,
+                    'safety_factor': c.safety_factor or DEFAULT_RBC_FACTORS['safety_factor']
+                }
+
+    def factors(self, blood_type: Optional[str] = None, prep_id: Optional[int] = None) -> Dict[str, float]:
+        """{'daily_consumption_rate': float, 'safety_factor': float} (복사본)"""
+        return dict(self._table.get((blood_type, prep_id), self.fallback))
+
+
+def _is_number(value: str) -> bool:
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+def load_reference_data(db: Session) -> ReferenceData:
+    """DB에서 기준정보 3종 적재 (3회 조회)"""
+    preps = [
+        PrepRef(id=p.id, component=p.component, preparation=p.preparation)
+        for p in db.query(BloodMaster).order_by(BloodMaster.id).all()
+    ]
+    safety_configs = [
+        SafetyRef(blood_type=sc.blood_type, prep_id=sc.prep_id,
+                  safety_qty=sc.safety_qty, alert_threshold=sc.alert_threshold)
+        for sc in db.query(SafetyConfig).order_by(SafetyConfig.id).all()
+    ]
+    configs = [
+        ConfigRef(
+            id=c.id, blood_type=c.blood_type, prep_id=c.prep_id,
+            config_key=c.config_key, config_value=c.config_value,
+            daily_consumption_rate=c.daily_consumption_rate,
+            safety_factor=c.safety_factor, danger_factor=c.danger_factor,
+            updated_at=c.updated_at
+        )
+        for c in db.query(MasterConfig).order_by(MasterConfig.id).all()
+    ]
+    return ReferenceData(preps, safety_configs, configs)
+
+
+class ReferenceCache:
+    """TTL + 명시적 무효화 기반 기준정보 캐시 (thread-safe)"""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._data: Optional[ReferenceData] = None
+        self._loaded_at: float = 0.0
+        self.version: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def _is_fresh(self) -> bool:
+        return self._data is not None and (time.monotonic() - self._loaded_at) < self.ttl_seconds
+
+    def get(self, db: Session) -> ReferenceData:
+        """유효한 캐시가 있으면 반환, 없으면 DB에서 적재"""
+        with self._lock:
+            if self._is_fresh():
+                self.hits += 1
+                return self._data
+            self.misses += 1
+            version_at_miss = self.version
+
+        data = load_reference_data(db)
+
+        with self._lock:
+            if self.version == version_at_miss:
+                self._data = data
+                self._loaded_at = time.monotonic()
+                # TTL 재적재도 새 세대로 취급 (version을 키로 쓰는 파생 캐시가 다른 워커의 변경을 반영하도록)
+                self.version += 1
+        return data
+
+    def invalidate(self) -> None:
+        """기준정보 변경 후 호출 - 다음 조회 시 재적재"""
+        with self._lock:
+            self._data = None
+            self.version += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'version': self.version,
+                'warm': self._is_fresh(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 3) if total else 0.0,
+                'ttl_seconds': self.ttl_seconds,
+            }
+
+
+reference_cache = ReferenceCache(ttl_seconds=settings.REFERENCE_CACHE_TTL_SECONDS)
@@ -0,0 +1,244 @@
+"""
+다중 해상도 재고 롤업 (inventory_rollup) - 시간/일/주/월 단위 분석용 사전 집계
+
+- 구간별 셀(혈액형/제제) 재고 최소/최대, 시간가중 평균, 입고/출고 합계
+- 닫힌 구간은 변하지 않으므로 마지막 저장 구간(열린 구간일 수 있음)부터만 재계산
+- 갱신은 쓰기 경로(재고 수정/일괄 저장)의 백그라운드 작업과 기동 시에만 수행 → 분석 조회(GET)는 읽기 전용
+  (열린 구간의 평균은 마지막 갱신 시각까지 가중, 이후 재고는 변동이 없으므로 최소/최대/입출고는 정확)
+- 재고 수준은 일자별 마감 재고(inventory_daily_snapshot)에서 그날 StockLog를 되감아 계단 함수로 복원
+  → 마감 재고의 원본은 스냅샷 하나뿐이고 롤업은 그 파생값 (되감는 중 음수는 0, 분석 역산과 동일)
+- hour 해상도는 ROLLUP_HOUR_RETENTION_DAYS 이내만 생성/보관 (갱신 시 오래된 행 삭제)
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, func, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database.database import SessionLocal
+from app.database.models import InventoryDailySnapshot, InventoryRollup, StockLog
+from app.services.daily_snapshot_service import get_daily_levels
+
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = ('hour', 'day', 'week', 'month')
+BUCKET_FREQ = {'hour': 'h', 'day': 'D', 'week': '7D', 'month': 'MS'}
+BUCKET_LABEL_FORMAT = {'hour': '%Y-%m-%d %H:00', 'day': '%Y-%m-%d', 'week': '%Y-%m-%d', 'month': '%Y-%m'}
+ROLLUP_COLUMNS = ['bucket_start', 'blood_type', 'prep_id', 'min_qty', 'avg_qty', 'max_qty', 'in_qty', 'out_qty']
+
+# 백그라운드 갱신 직렬화: 실행 중에 요청이 오면 끝난 뒤 한 번 더 실행
+_refresh_lock = threading.Lock()
+_refresh_pending = False
+
+
+def bucket_floor(index: pd.DatetimeIndex, resolution: str) -> pd.DatetimeIndex:
+    """일시 → 소속 구간 시작 (주는 월요일 시작)"""
+    if resolution == 'hour':
+        return index.floor('h')
+    days = index.floor('D')
+    if resolution == 'day':
+        return days
+    if resolution == 'week':
+        return days - pd.to_timedelta(days.dayofweek, unit='D')
+    return days.to_period('M').to_timestamp()
+
+
+def hour_retention_start(now: datetime) -> datetime:
+    """hour 롤업 보관 시작 시각 (이전 구간은 생성하지 않고 갱신 시 삭제)"""
+    return bucket_floor(
+        pd.DatetimeIndex([now - timedelta(days=settings.ROLLUP_HOUR_RETENTION_DAYS)]), 'hour'
+    )[0].to_pydatetime()
+
+
+def compute_rollups(logs: pd.DataFrame, day_close: pd.DataFrame, from_ts: datetime,
+                    now: datetime, resolution: str) -> pd.DataFrame:
+    """
+    from_ts(구간 시작) 이후 구간별 롤업 계산 - 일자별 마감 재고 스냅샷 기준
+
+    하루 안의 재고는 그날 마감 재고(inventory_daily_snapshot)에서 그날 로그를 되감아 복원
+    → 일 단위 이상 롤업의 재고 수준은 스냅샷과 항상 일치 (음수 보정은 분석 역산과 같은 누적 방식)
+
+    Args:
+        logs: log_date, blood_type, prep_id, in_qty, out_qty (from_ts 당일 0시 이후 전체)
+        day_close: index=일자(계산 시작일 ~ now 당일), columns=(blood_type, prep_id) 마감 재고
+                   (get_daily_levels, 스냅샷이 없는 로그 셀은 0으로 간주). 첫 일자 0시부터 계산하며
+                   from_ts 당일 이후여야 함 (구간 시작 전 첫 스냅샷이 있으면 그 일자부터)
+
+    Returns:
+        ROLLUP_COLUMNS 롱 포맷 (구간 × 셀)
+    """
+    columns = day_close.columns
+    if not logs.empty:
+        log_cells = pd.MultiIndex.from_frame(logs[['blood_type', 'prep_id']].drop_duplicates())
+        columns = columns.append(log_cells.difference(columns)) if len(columns) else log_cells
+    columns = columns.set_names(['blood_type', 'prep_id'])
+    if not len(columns):
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+    logs = logs.assign(log_date=pd.to_datetime(logs['log_date']))
+    logs = logs[logs['log_date'] >= pd.Timestamp(day_close.index[0])]
+    col_pos = columns.get_indexer(pd.MultiIndex.from_arrays([logs['blood_type'], logs['prep_id']])) \
+        if not logs.empty else np.array([], dtype='int64')
+    logs = logs.assign(col=col_pos)
+
+    # (시각 × 셀) 변동 행렬: 로그 시각 + 구간 경계 + 일자 경계(변동 0)를 합친 시간축 (계산 시작일 0시부터)
+    from_day = pd.Timestamp(day_close.index[0])
+    boundaries = pd.date_range(bucket_floor(pd.DatetimeIndex([from_day]), resolution)[0],
+                               bucket_floor(pd.DatetimeIndex([now]), resolution)[0], freq=BUCKET_FREQ[resolution])
+    boundaries = boundaries[boundaries >= from_day]
+    day_starts = pd.date_range(from_day, pd.Timestamp(now).floor('D'), freq='D')
+    deltas = pd.Series(
+        (logs['in_qty'] - logs['out_qty']).to_numpy(dtype='int64'),
+        index=pd.MultiIndex.from_arrays([logs['log_date'], logs['col']])
+    ).groupby(level=[0, 1]).sum().unstack(fill_value=0) if not logs.empty else pd.DataFrame()
+    timeline = boundaries.union(day_starts).union(pd.DatetimeIndex(deltas.index))
+    deltas = deltas.reindex(index=timeline, columns=range(len(columns)), fill_value=0)
+
+    # 각 시각 직후 재고 = 그날 마감 재고에서 같은 날 이후 변동을 되감은 값
+    #   after = 같은 날 해당 시각 이후(미포함) 변동 합계, 재고 = max(마감, 이후 after의 최대) - after
+    day_of = timeline.floor('D')
+    since = deltas.iloc[::-1].groupby(day_of[::-1]).cumsum().iloc[::-1]
+    after = since - deltas
+    peak = after.iloc[::-1].groupby(day_of[::-1]).cummax().iloc[::-1].to_numpy(dtype='int64')
+    close = day_close.reindex(index=day_of.date, columns=columns, fill_value=0).fillna(0).to_numpy(dtype='int64')
+    levels = np.maximum(close, peak) - after.to_numpy(dtype='int64')
+
+    # 다음 시각(마지막은 now)까지 유지된 시간(초)으로 가중
+    durations = np.diff(np.append(timeline.to_numpy(), np.datetime64(now))).astype('timedelta64[s]').astype('float64')
+    buckets = bucket_floor(timeline, resolution)
+    weighted = pd.DataFrame(levels * durations[:, None], index=buckets).groupby(level=0).sum()
+    total_time = pd.Series(durations, index=buckets).groupby(level=0).sum()
+    level_frame = pd.DataFrame(levels, index=buckets).groupby(level=0)
+    minimum, maximum = level_frame.min(), level_frame.max()
+    # 경과 시간이 0인 구간(방금 시작한 열린 구간)은 마지막 재고를 평균으로 사용
+    average = weighted.div(total_time.replace(0, np.nan), axis=0).fillna(level_frame.last())
+
+    flows = pd.DataFrame({
+        'bucket_start': bucket_floor(pd.DatetimeIndex(logs['log_date']), resolution),
+        'col': logs['col'].to_numpy(),
+        'in_qty': logs['in_qty'].to_numpy(dtype='int64'),
+        'out_qty': logs['out_qty'].to_numpy(dtype='int64'),
+    }).groupby(['bucket_start', 'col'])[['in_qty', 'out_qty']].sum()
+
+    n_buckets, n_cells = average.shape
+    result = pd.DataFrame({
+        'bucket_start': np.repeat(average.index.to_numpy(), n_cells),
+        'blood_type': np.tile(columns.get_level_values('blood_type').to_numpy(), n_buckets),
+        'prep_id': np.tile(columns.get_level_values('prep_id').to_numpy(), n_buckets),
+        'col': np.tile(np.arange(n_cells), n_buckets),
+        'min_qty': minimum.to_numpy().ravel(),
+        'avg_qty': np.round(average.to_numpy().ravel(), 2),
+        'max_qty': maximum.to_numpy().ravel(),
+    })
+    result = result.join(flows, on=['bucket_start', 'col']).fillna({'in_qty': 0, 'out_qty': 0})
+    # from_ts 당일 0시부터 계산한 앞쪽 구간(hour) 제외
+    return result.loc[result['bucket_start'] >= pd.Timestamp(from_ts), ROLLUP_COLUMNS].reset_index(drop=True)
+
+
+def refresh_rollups(db: Session, resolution: str, now: Optional[datetime] = None) -> int:
+    """
+    마지막 저장 구간부터 현재까지 롤업 재계산 후 교체 (없으면 이력 시작부터)
+
+    Returns:
+        다시 쓴 롤업 행 수 (동시 갱신과 충돌하면 0)
+    """
+    now = now or datetime.now()
+    retention_start = hour_retention_start(now)
+    last = db.query(func.max(InventoryRollup.bucket_start)).filter(
+        InventoryRollup.resolution == resolution
+    ).scalar()
+    if last is not None:
+        from_ts = pd.Timestamp(last).to_pydatetime()
+    else:
+        from_ts = db.query(func.min(StockLog.log_date)).scalar() or now
+    if resolution == 'hour':
+        # 보관 기간 밖 구간은 다시 만들지 않음 (오래된 행은 아래에서 삭제)
+        from_ts = max(from_ts, retention_start)
+    from_ts = bucket_floor(pd.DatetimeIndex([from_ts]), resolution)[0].to_pydatetime()
+
+    # 하루 안 재고는 그날 마감 스냅샷에서 되감으므로 from_ts 당일 0시부터 로그를 읽음
+    # (첫 스냅샷(기초 재고) 이전 일자는 재고 기록이 없으므로 제외)
+    first_day = db.query(func.min(InventoryDailySnapshot.snapshot_date)).scalar()
+    from_day = pd.Timestamp(from_ts).floor('D').to_pydatetime()
+    if first_day is not None:
+        from_day = max(from_day, pd.Timestamp(first_day).to_pydatetime())
+    day_close = get_daily_levels(db, from_day.date(), now.date())
+    logs = pd.DataFrame(
+        db.query(
+            StockLog.log_date, StockLog.blood_type, StockLog.prep_id, StockLog.in_qty, StockLog.out_qty
+        ).filter(StockLog.log_date >= from_day).all(),
+        columns=['log_date', 'blood_type', 'prep_id', 'in_qty', 'out_qty']
+    )
+    rows = compute_rollups(logs, day_close, from_ts, now, resolution)
+
+    try:
+        db.execute(delete(InventoryRollup).where(
+            InventoryRollup.resolution == resolution,
+            InventoryRollup.bucket_start >= from_ts
+        ))
+        if resolution == 'hour':
+            db.execute(delete(InventoryRollup).where(
+                InventoryRollup.resolution == 'hour',
+                InventoryRollup.bucket_start < retention_start
+            ))
+        if not rows.empty:
+            db.execute(insert(InventoryRollup), [
+                {
+                    'resolution': resolution, 'bucket_start': r.bucket_start.to_pydatetime(),
+                    'blood_type': r.blood_type, 'prep_id': int(r.prep_id),
+                    'min_qty': int(r.min_qty), 'avg_qty': float(r.avg_qty), 'max_qty': int(r.max_qty),
+                    'in_qty': int(r.in_qty), 'out_qty': int(r.out_qty)
+                }
+                for r in rows.itertuples(index=False)
+            ])
+        db.commit()
+    except IntegrityError:
+        # 다른 요청이 같은 구간을 먼저 갱신함 → 그 결과 사용
+        db.rollback()
+        return 0
+    return len(rows)
+
+
+def refresh_all_rollups() -> None:
+    """
+    모든 해상도 롤업 갱신 (자체 세션, BackgroundTasks/기동 시 호출)
+
+    동시에 여러 번 호출되면 한 번에 하나만 실행하고, 실행 중 들어온 요청은 끝난 뒤 1회로 합쳐 재실행.
+    """
+    global _refresh_pending
+    _refresh_pending = True
+    while _refresh_pending and _refresh_lock.acquire(blocking=False):
+        try:
+            _refresh_pending = False
+            now = datetime.now()
+            db = SessionLocal()
+            try:
+                for resolution in RESOLUTIONS:
+                    refresh_rollups(db, resolution, now)
+            finally:
+                db.close()
+        except Exception:
+            logger.exception("재고 롤업 갱신 실패")
+        finally:
+            _refresh_lock.release()
+
+
+def load_rollups(db: Session, resolution: str, start: datetime, end: datetime) -> List[tuple]:
+    """[start, end) 구간 시작을 갖는 롤업 행 (ROLLUP_COLUMNS 순서 튜플)"""
+    rollup = InventoryRollup
+    rows = db.query(
+        rollup.bucket_start, rollup.blood_type, rollup.prep_id,
+        rollup.min_qty, rollup.avg_qty, rollup.max_qty, rollup.in_qty, rollup.out_qty
+    ).filter(
+        rollup.resolution == resolution,
+        rollup.bucket_start >= start,
+        rollup.bucket_start < end
+    ).order_by(rollup.bucket_start).all()
+    return [tuple(row) for row in rows]
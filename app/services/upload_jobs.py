@@ -0,0 +1,265 @@
+"""
+엑셀 업로드 백그라운드 작업 (/api/inventory/upload?async=1 → /api/jobs/{id})
+
+- 업로드 파일은 작업 디렉터리(UPLOAD_JOB_DIR)에 스풀하고 원본을 upload_job_file에 저장한 뒤 즉시 응답
+  (작업 디렉터리는 파싱용 사본 - 재시작으로 지워지면 DB 원본에서 다시 만듦, 완료/실패 시 원본 삭제)
+- 이벤트 루프의 백그라운드 태스크가 파싱(프로세스 풀) → 입고 내역 저장을 수행하며 진행률을 DB에 기록
+- 기동 시(lifespan) queued/running 상태로 남은 작업을 다시 실행
+- 실행 선점은 attempts 조건부 UPDATE로 1회만 성공, UPLOAD_JOB_MAX_ATTEMPTS 초과 시 실패 처리
+- 이미 저장된 파일(SHA-256 일치)은 파싱하지 않고 duplicate 처리
+"""
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+import logging
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.database.database import SessionLocal
+from sqlalchemy import delete, insert
+
+from app.database.models import UploadJob, UploadJobFile
+from app.services.excel_service import spool_upload
+from app.services.inbound_upload_service import (
+    InboundUploadError, find_duplicate_uploads, parse_uploaded_files, save_inbound_uploads
+)
+
+
+logger = logging.getLogger(__name__)
+
+# 실행 중 태스크 참조 보관 (GC 방지)
+_tasks: Set[asyncio.Task] = set()
+
+
+def job_dir(job_id: str) -> str:
+    base = settings.UPLOAD_JOB_DIR or os.path.join(tempfile.gettempdir(), "schbc_upload_jobs")
+    return os.path.join(base, job_id)
+
+
+def job_to_dict(job: UploadJob) -> Dict:
+    """작업 상태 응답"""
+    files = json.loads(job.files)
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "total_files": job.total_files,
+        "processed_files": job.processed_files,
+        "progress": round(job.processed_files / job.total_files, 3) if job.total_files else 1.0,
+        "filenames": [f["filename"] for f in files],
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def _insert_job(db, job_id: str, files: List[Dict]) -> UploadJob:
+    """작업 행 + 파일 원본 저장 (재시작 후에도 재실행 가능하도록 같은 트랜잭션에서)"""
+    job = UploadJob(id=job_id, status="queued", files=json.dumps(files, ensure_ascii=False),
+                    total_files=len(files), processed_files=0)
+    try:
+        db.add(job)
+        db.flush()
+        for seq, f in enumerate(files):
+            with open(f["path"], "rb") as fp:
+                db.execute(insert(UploadJobFile), {"job_id": job_id, "seq": seq, "content": fp.read()})
+        db.commit()
+        db.refresh(job)  # 커밋으로 만료된 속성을 여기서 적재 → 호출자(이벤트 루프)의 속성 접근이 DB를 조회하지 않음
+    except BaseException:
+        db.rollback()
+        raise
+    return job
+
+
+async def create_upload_job(db, uploads) -> UploadJob:
+    """업로드 파일을 작업 디렉터리에 스풀하고 원본과 함께 queued 작업 생성 (커밋 포함, DB 작업은 threadpool)"""
+    job_id = uuid.uuid4().hex
+    directory = job_dir(job_id)
+    os.makedirs(directory, exist_ok=True)
+    try:
+        files = []
+        for upload in uploads:
+            path, sha256 = await spool_upload(upload, suffix=os.path.splitext(upload.filename)[1], directory=directory)
+            files.append({"filename": upload.filename, "path": path, "sha256": sha256})
+        return await run_in_threadpool(_insert_job, db, job_id, files)
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+
+
+def start_upload_job(job_id: str) -> None:
+    """현재 이벤트 루프에서 작업 실행 예약"""
+    task = asyncio.get_running_loop().create_task(run_upload_job(job_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def _claim(job_id: str) -> Optional[List[Dict]]:
+    """queued/running 작업을 실행 상태로 선점 (다른 실행이 먼저 선점했으면 None)"""
+    db = SessionLocal()
+    try:
+        job = db.query(UploadJob).filter(UploadJob.id == job_id).first()
+        if job is None or job.status not in ("queued", "running"):
+            return None
+        if job.attempts >= settings.UPLOAD_JOB_MAX_ATTEMPTS:
+            _fail(db, job_id, f"재시도 횟수({job.attempts}회) 초과로 중단되었습니다.")
+            return None
+        claimed = db.query(UploadJob).filter(
+            UploadJob.id == job_id, UploadJob.attempts == job.attempts
+        ).update({
+            "status": "running", "attempts": job.attempts + 1,
+            "processed_files": 0, "started_at": datetime.now()
+        }, synchronize_session=False)
+        db.commit()
+        return json.loads(job.files) if claimed else None
+    finally:
+        db.close()
+
+
+def _set_progress(job_id: str, processed: int) -> None:
+    db = SessionLocal()
+    try:
+        # 순서가 뒤바뀐 갱신이 진행률을 되돌리지 않도록 증가할 때만 반영
+        db.query(UploadJob).filter(
+            UploadJob.id == job_id, UploadJob.processed_files < processed
+        ).update({"processed_files": processed}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _fail(db, job_id: str, error: str) -> None:
+    db.query(UploadJob).filter(UploadJob.id == job_id).update({
+        "status": "failed", "error": error, "finished_at": datetime.now()
+    }, synchronize_session=False)
+    db.execute(delete(UploadJobFile).where(UploadJobFile.job_id == job_id))
+    db.commit()
+    shutil.rmtree(job_dir(job_id), ignore_errors=True)
+
+
+def _restore_files(job_id: str, files: List[Dict]) -> bool:
+    """
+    작업 디렉터리에 없는 파일(재시작으로 유실)을 upload_job_file 원본에서 다시 만듦
+
+    Returns:
+        모든 파일이 준비되었는지 (원본 저장 이전에 만들어진 작업은 복원 불가)
+    """
+    missing = [seq for seq, f in enumerate(files) if not os.path.exists(f["path"])]
+    if not missing:
+        return True
+    directory = job_dir(job_id)
+    os.makedirs(directory, exist_ok=True)
+    db = SessionLocal()
+    try:
+        contents = dict(db.query(UploadJobFile.seq, UploadJobFile.content).filter(
+            UploadJobFile.job_id == job_id, UploadJobFile.seq.in_(missing)
+        ).all())
+    finally:
+        db.close()
+    if len(contents) < len(missing):
+        return False
+    for seq in missing:
+        path = os.path.join(directory, f"upload_{seq}{os.path.splitext(files[seq]['filename'])[1]}")
+        with open(path, "wb") as fp:
+            fp.write(contents[seq])
+        files[seq]["path"] = path
+    return True
+
+
+def _find_duplicates(files: List[Dict]) -> Dict:
+    for f in files:
+        if not f.get("sha256"):
+            # 해시 기록 이전에 만들어진 작업 → 스풀 파일에서 계산
+            with open(f["path"], "rb") as fp:
+                f["sha256"] = hashlib.file_digest(fp, "sha256").hexdigest()
+    db = SessionLocal()
+    try:
+        return find_duplicate_uploads(db, [f["filename"] for f in files], [f["sha256"] for f in files])
+    finally:
+        db.close()
+
+
+def _save(job_id: str, files: List[Dict], parsed: list) -> None:
+    """입고 내역 저장 후 작업 완료/실패 기록"""
+    filenames = [f["filename"] for f in files]
+    db = SessionLocal()
+    try:
+        try:
+            result = save_inbound_uploads(db, filenames, parsed, [f["sha256"] for f in files])
+        except InboundUploadError as e:
+            _fail(db, job_id, e.message)
+            return
+        db.query(UploadJob).filter(UploadJob.id == job_id).update({
+            "status": "done", "processed_files": len(filenames),
+            "result": json.dumps(result, ensure_ascii=False), "finished_at": datetime.now()
+        }, synchronize_session=False)
+        db.execute(delete(UploadJobFile).where(UploadJobFile.job_id == job_id))
+        db.commit()
+        shutil.rmtree(job_dir(job_id), ignore_errors=True)
+    finally:
+        db.close()
+
+
+async def run_upload_job(job_id: str) -> None:
+    """작업 실행: 선점 → 파일 복원 → 중복 파일 제외 → 동시 파싱(진행률 기록) → 한 트랜잭션 저장"""
+    try:
+        files = await run_in_threadpool(_claim, job_id)
+        if files is None:
+            return
+        loop = asyncio.get_running_loop()
+
+        def on_parsed(done: int) -> None:
+            task = loop.create_task(run_in_threadpool(_set_progress, job_id, done))
+            _tasks.add(task)
+            task.add_done_callback(_tasks.discard)
+
+        if not await run_in_threadpool(_restore_files, job_id, files):
+            db = SessionLocal()
+            try:
+                _fail(db, job_id, "서버 재시작으로 업로드 파일이 유실되었습니다. 다시 업로드해 주세요.")
+            finally:
+                db.close()
+            return
+
+        skip = await run_in_threadpool(_find_duplicates, files)
+        parsed = await parse_uploaded_files([f["path"] for f in files], on_parsed, skip)
+        await run_in_threadpool(_save, job_id, files, parsed)
+    except Exception as e:
+        logger.exception(f"업로드 작업 {job_id} 실패")
+        db = SessionLocal()
+        try:
+            _fail(db, job_id, f"처리 중 오류: {str(e)}")
+        finally:
+            db.close()
+
+
+def resume_upload_jobs(db) -> int:
+    """
+    기동 시 미완료 작업 재실행 예약 + 보관 기간 지난 작업 정리 (lifespan에서 호출)
+
+    단일 프로세스 배포 기준: 기동 시점의 running 작업은 이전 프로세스가 중단한 것으로 간주.
+    작업 디렉터리가 비어 있어도(재배포 등) 실행 시 upload_job_file 원본에서 복원.
+
+    Returns:
+        재실행 예약한 작업 수
+    """
+    cutoff = datetime.now() - timedelta(days=settings.UPLOAD_JOB_RETENTION_DAYS)
+    db.query(UploadJob).filter(
+        UploadJob.status.in_(("done", "failed")), UploadJob.created_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+
+    resumed = 0
+    for (job_id,) in db.query(UploadJob.id).filter(UploadJob.status.in_(("queued", "running"))).all():
+        start_upload_job(job_id)
+        resumed += 1
+    return resumed
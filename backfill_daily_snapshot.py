@@ -0,0 +1,38 @@
+"""
+inventory_daily_snapshot 백필 스크립트
+- StockLog 전체 이력 + 현재 재고로 일자별 마감 재고를 역산해 테이블을 재생성
+- 테이블이 비어 있으면 앱 기동 시 자동 백필됨 → 이 스크립트는 스냅샷을 강제로 다시 만들 때만 사용
+  (이후에는 재고 저장 시 자동 증분 갱신)
+- 롤업(inventory_rollup)은 스냅샷에서 파생되므로 함께 다시 생성
+"""
+from sqlalchemy import delete
+from sqlalchemy.orm import sessionmaker
+
+from app.database.database import engine
+from app.database.models import Base, InventoryDailySnapshot, InventoryRollup
+from app.services.daily_snapshot_service import backfill_daily_snapshots
+from app.services.rollup_service import RESOLUTIONS, refresh_rollups
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def main():
+    Base.metadata.create_all(bind=engine, tables=[InventoryDailySnapshot.__table__, InventoryRollup.__table__])
+    db = SessionLocal()
+    try:
+        rows = backfill_daily_snapshots(db)
+        print(f"Backfill complete! inventory_daily_snapshot rows: {rows}")
+
+        db.execute(delete(InventoryRollup))
+        db.commit()
+        for resolution in RESOLUTIONS:
+            print(f"inventory_rollup {resolution} rows: {refresh_rollups(db, resolution)}")
+    except Exception as e:
+        db.rollback()
+        print(f"Error: {e}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
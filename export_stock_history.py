@@ -0,0 +1,51 @@
+"""
+재고 이력 컬럼형 내보내기 스크립트 (Parquet / Arrow IPC stream)
+- stock_log / inbound_history / daily_levels 를 파일로 저장 (QI 오프라인 분석용)
+- 서버 측 커서 배치로 읽어 기록하므로 전체 이력도 메모리 일정
+
+사용 예:
+    python export_stock_history.py stock_log -o stock_log.parquet --start 2025-01-01 --end 2025-12-31
+    python export_stock_history.py daily_levels --format arrow -o levels.arrows --blood-type A --blood-type O
+"""
+import argparse
+from datetime import datetime
+
+from sqlalchemy.orm import sessionmaker
+
+from app.database.database import engine
+from app.services.export_service import EXPORT_DATASETS, EXPORT_FORMATS, write_export
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _date(value: str):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="재고 이력 Parquet/Arrow 내보내기")
+    parser.add_argument("dataset", choices=EXPORT_DATASETS)
+    parser.add_argument("-o", "--output", required=True, help="출력 파일 경로")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="parquet")
+    parser.add_argument("--start", type=_date, help="시작일 (YYYY-MM-DD)")
+    parser.add_argument("--end", type=_date, help="종료일 (YYYY-MM-DD)")
+    parser.add_argument("--blood-type", action="append", choices=["A", "B", "O", "AB"], dest="blood_types")
+    parser.add_argument("--batch-size", type=int, help="배치 크기 (기본: EXPORT_BATCH_SIZE)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        with open(args.output, "wb") as sink:
+            rows = write_export(
+                db, args.dataset, args.format, sink,
+                start=args.start, end=args.end, blood_types=args.blood_types, batch_size=args.batch_size
+            )
+        print(f"Export complete! {args.dataset} → {args.output} ({rows} rows)")
+    except Exception as e:
+        print(f"Error: {e}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
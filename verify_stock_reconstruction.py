@@ -0,0 +1,103 @@
+"""
+재고 역산 회귀 확인 스크립트 - reconstruct_stock_levels vs 기존(반복문) 역산
+
+음수가 되는 이력(출고가 재고보다 많은 불일치 이력)에서도
+- 각 변경점 재고가 기존 역산(되감으며 0 미만이면 0)과 같은지
+- 종료일 마감 재고(max(현재, 이후 변동 합계 최대) - 순변동)에서 시작한 기간 역산이
+  현재부터 전체를 되감은 결과와 같은지
+확인합니다. (DB 불필요, 실패 시 종료 코드 1)
+
+사용법: python verify_stock_reconstruction.py
+"""
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from app.services.analytics_service import reconstruct_stock_levels
+
+CELLS = [(bt, pid) for bt in ('A', 'B', 'O', 'AB') for pid in (1, 2, 3)]
+NOW_LABEL = '2099-01-01 00:00'
+
+
+def make_history(seed: int, n: int = 400):
+    """분 단위가 겹치지 않는 로그 (출고 편향 → 중간 재고가 음수로 내려가는 구간 포함)"""
+    rng = random.Random(seed)
+    base = datetime(2026, 1, 1)
+    minutes = rng.sample(range(60 * 24 * 60), n)
+    rows = []
+    for m in minutes:
+        bt, pid = rng.choice(CELLS)
+        rows.append({
+            'log_date': base + timedelta(minutes=m), 'blood_type': bt, 'prep_id': pid,
+            'delta': rng.randint(-5, 3)
+        })
+    df = pd.DataFrame(rows).sort_values('log_date', ignore_index=True)
+    current = {cell: rng.randint(0, 4) for cell in CELLS}
+    return df, current
+
+
+def baseline_levels(df: pd.DataFrame, current: dict):
+    """
+    기존 역산: 최신 로그부터 되감으며 셀 재고 -= delta, 0 미만이면 0 → 로그 시점마다 전체 셀 스냅샷
+
+    Returns:
+        (시점 × 셀 재고, 0으로 보정된 횟수)
+    """
+    iter_stock = dict(current)
+    snapshots = {NOW_LABEL: dict(iter_stock)}
+    clipped = 0
+    for row in df.iloc[::-1].itertuples(index=False):
+        key = (row.blood_type, row.prep_id)
+        clipped += iter_stock[key] - row.delta < 0
+        iter_stock[key] = max(0, iter_stock[key] - row.delta)
+        snapshots[row.log_date.strftime('%Y-%m-%d %H:%M')] = dict(iter_stock)
+    frame = pd.DataFrame.from_dict(snapshots, orient='index').sort_index()
+    frame.columns = pd.MultiIndex.from_tuples(frame.columns, names=['blood_type', 'prep_id'])
+    return frame, clipped
+
+
+def end_stock_after(df_after: pd.DataFrame, current: dict) -> dict:
+    """analytics_service의 종료일 마감 재고 SQL 집계와 같은 계산 (셀별 최신부터 누적 최대 / 순변동)"""
+    end_stock = dict(current)
+    for (bt, pid), group in df_after.groupby(['blood_type', 'prep_id']):
+        since = group.sort_values('log_date', ascending=False)['delta'].cumsum()
+        end_stock[(bt, pid)] = max(end_stock.get((bt, pid), 0), int(since.max())) - int(since.iloc[-1])
+    return end_stock
+
+
+def main() -> int:
+    failures = 0
+    clipped_total = 0
+    for seed in range(20):
+        df, current = make_history(seed)
+        expected, clipped = baseline_levels(df, current)
+        clipped_total += clipped
+
+        actual = reconstruct_stock_levels(df, current, NOW_LABEL)
+        actual = actual.reindex(columns=expected.columns)
+        if not actual.equals(expected):
+            failures += 1
+            print(f"❌ seed={seed}: 전체 역산이 기존 결과와 다름")
+            continue
+
+        # 기간 역산: 종료 시점 이후 로그는 마감 재고 집계로 대체
+        cut = df['log_date'].iloc[len(df) // 2]
+        before, after = df[df['log_date'] < cut], df[df['log_date'] >= cut]
+        window = reconstruct_stock_levels(before, end_stock_after(after, current), NOW_LABEL)
+        labels = [label for label in window.index if label != NOW_LABEL]
+        if not window.loc[labels, expected.columns].equals(expected.loc[labels]):
+            failures += 1
+            print(f"❌ seed={seed}: 기간 역산이 기존 결과와 다름")
+
+    print(f"음수 → 0 보정 횟수 (20개 이력 합계): {clipped_total}")
+    if failures:
+        print(f"❌ 불일치 {failures}건")
+        return 1
+    print("✅ 재고 역산이 기존 결과와 일치")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())